@@ -1,17 +1,62 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS, cross_origin
 import logging
 import datarobot as dr
 import os
-import json 
+import re
 from pathlib import Path
-from create_graph_from_use_case import build_graph, write_edges, write_nodes
+from create_graph_from_use_case import crawl_graph, expand_node, merge_expansion, DEFAULT_MAX_WORKERS
+from asset_cache import AssetCache, DEFAULT_MAX_ENTRIES
+from client_pool import ClientPool
+from rate_limit import DEFAULT_MAX_REQUESTS_PER_SECOND, DEFAULT_REQUESTS_PER_SECOND
+from graph_jobs import GraphJobManager, DEFAULT_MAX_CONCURRENT_BUILDS
+from graph_stream import compressed_variant, follow_build
+from graph_store import build_lock, current_version, graph_file, job_stream_file, load_graph, load_manifest, load_previous, store_graph
+from build_options import BuildOptions
+from lineage_index import LineageIndexCache
+from global_index import GlobalLineageIndex
 
 logger = logging.getLogger(name = "backend-debugger")
 logger.setLevel("INFO")
 app = Flask(__name__)
 CORS(app, origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])  # Enable CORS for all routes
-local_storage = "./storage"
+local_storage = os.environ.get("GRAPH_STORAGE", "./storage")
+os.makedirs(local_storage, exist_ok = True)
+max_workers = int(os.environ.get("GRAPH_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+## datastores, datasources, dataset versions etc. are shared between use cases, keep them across builds
+asset_cache = AssetCache(os.path.join(local_storage, "asset_cache.sqlite"), 
+                         max_entries = int(os.environ.get("ASSET_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)))
+## one keep-alive client per (token, endpoint) instead of a new dr.Client on every request
+client_pool = ClientPool(pool_maxsize = max_workers,
+                         requests_per_second = float(os.environ.get("GRAPH_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND)),
+                         max_requests_per_second = float(os.environ.get("GRAPH_MAX_REQUESTS_PER_SECOND", DEFAULT_MAX_REQUESTS_PER_SECOND)),
+                         replay_file = os.environ.get("GRAPH_REPLAY_FILE") or None)
+## a build still waiting on rate limits after this long fails instead of storing a partial graph
+build_deadline_seconds = float(os.environ["GRAPH_BUILD_DEADLINE_SECONDS"]) if os.environ.get("GRAPH_BUILD_DEADLINE_SECONDS") else None
+## adjacency of recently queried stored graphs, for ancestor/descendant lookups
+lineage_indexes = LineageIndexCache()
+## every stored use case graph merged into one store, for lineage questions across use cases
+global_index = GlobalLineageIndex(os.path.join(local_storage, "lineage_index.sqlite"))
+global_index.sync_directory(local_storage)
+## graph builds run in the background, one at a time per use case. across server processes
+## builds take graph_store.build_lock, and job statuses are shared through storage/jobs
+graph_jobs = GraphJobManager(max_concurrent_builds = int(os.environ.get("GRAPH_MAX_CONCURRENT_BUILDS", DEFAULT_MAX_CONCURRENT_BUILDS)),
+                             status_dir = os.path.join(local_storage, "jobs"))
+## keep the profile of the last build of each use case beside its graph, see /getBuildProfile
+write_build_profiles = os.environ.get("GRAPH_WRITE_PROFILE", "true").lower() == "true"
+## use case ids end up in storage paths, only DataRobot object ids are accepted
+USE_CASE_ID = re.compile(r"[0-9a-f]{24}")
+## endpoints that read or write the stored graph of their useCaseId
+USE_CASE_ENDPOINTS = {"build_use_case_graph", "stream_use_case_graph", "expand_use_case_node", "get_compact_graph",
+                      "get_edges", "get_nodes", "get_ancestors", "get_descendants"}
+
+@app.before_request
+def check_use_case_id():
+    use_case_id = request.args.get("useCaseId")
+    if use_case_id is None and request.endpoint in USE_CASE_ENDPOINTS:
+        return jsonify("useCaseId is required"), 400
+    if use_case_id is not None and not USE_CASE_ID.fullmatch(use_case_id):
+        return jsonify(f"invalid use case id {use_case_id!r}"), 400
 
 @app.route('/ping', methods=['GET'])
 @cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
@@ -24,47 +69,351 @@ def get_use_cases():
     headers = request.headers 
     token = headers.get('Authorization', "").replace("Bearer ", "")
     endpoint = headers.get("Endpoint")
-    client = dr.Client(token=token, endpoint=endpoint)
-    use_cases = dr.UseCase.list()
+    with client_pool.lease(token, endpoint):
+        use_cases = dr.UseCase.list()
     use_cases_list = [dict(name = u.name, id = u.id) for u in use_cases]
     return jsonify(use_cases_list)
 
+def _build_options():
+    ## ?maxDepth=&includeLabels=a,b&excludeLabels=c&modelSummary=true of a build request, None for a full build
+    max_depth = request.args.get("maxDepth")
+    include_labels = request.args.get("includeLabels")
+    exclude_labels = request.args.get("excludeLabels")
+    options = BuildOptions(max_depth = int(max_depth) if max_depth else None,
+                           include_labels = include_labels.split(",") if include_labels else None,
+                           exclude_labels = exclude_labels.split(",") if exclude_labels else None,
+                           model_summary = request.args.get("modelSummary", "false").lower() == "true")
+    return None if options.is_default else options
+
+def _stored_options_differ(use_case_id, options):
+    ## a stored graph built with other options than the request asks for has to be rebuilt
+    manifest = load_manifest(local_storage, use_case_id)
+    return manifest is not None and manifest.get("options", {}) != (options.to_dict() if options else {})
+
+def _job_options(options):
+    ## what a build job is submitted with, see GraphJob.options
+    return options.to_dict() if options is not None else {}
+
+def _busy(use_case_id, job):
+    ## a request can't join a job building something else, and a second build would wait on it anyway
+    return jsonify(dict(jobId = job.id, useCaseId = use_case_id, status = job.status, options = job.options,
+                        message = f"use case {use_case_id} is being built with other options, retry once job {job.id} is done")), 409
+
+def _build_use_case_graph(use_case_id, token, endpoint, refresh, options = None):
+    ## returns the function a graph_jobs worker thread runs for the build
+    requested_version = current_version(local_storage, use_case_id)
+    def build(job):
+        stream_file = _stream_file(use_case_id, job.id)
+        job.progress.set_phase("waiting")
+        with build_lock(local_storage, use_case_id, owner = dict(jobId = job.id)):
+            ## another server process stored the graph this request asks for while this one waited for the lock
+            if not refresh and current_version(local_storage, use_case_id) != requested_version and not _stored_options_differ(use_case_id, options):
+                return
+            previous_nodes, previous_manifest = load_previous(local_storage, use_case_id) if refresh else (None, None)
+            try:
+                with client_pool.lease(token, endpoint) as client:
+                    job.profile.endpoint = client.endpoint
+                    nodes, edges, manifest = crawl_graph(client, use_case_id, max_workers = max_workers, asset_cache = asset_cache,
+                                                         previous_nodes = previous_nodes, previous_manifest = previous_manifest,
+                                                         progress = job.progress, stream_to = stream_file, profile = job.profile,
+                                                         deadline_seconds = build_deadline_seconds, options = options)
+                store_graph(local_storage, use_case_id, nodes, edges, manifest, stream_file = stream_file, global_index = global_index,
+                            profile = job.profile.summary() if write_build_profiles else None)
+            except Exception:
+                if os.path.exists(stream_file):
+                    os.remove(stream_file)
+                raise
+    return build
+
+def _send_stored(path, mimetype, version = None):
+    ## stored graphs are served as the raw file (sendfile where the server supports it), with
+    ## a precompressed variant when the client accepts one and a 304 when its ETag still matches
+    if not os.path.exists(path):
+        return jsonify(f"{os.path.basename(path)} not found, build the use case graph first"), 404
+    path, encoding = compressed_variant(path, request.accept_encodings)
+    response = send_file(os.path.abspath(path), mimetype = mimetype, conditional = True, etag = True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if version:
+        ## pass it back as ?version= to read the other files of the same snapshot
+        response.headers["X-Graph-Version"] = version
+    response.vary.add("Accept-Encoding")
+    ## cached copies have to be revalidated, the file changes whenever the graph is rebuilt
+    response.cache_control.no_cache = True
+    return response
+
+def _send_graph_file(use_case_id, kind, mimetype):
+    ## a file of the snapshot requested with ?version=, or of the published one
+    try:
+        version = request.args.get("version") or current_version(local_storage, use_case_id)
+        path = graph_file(local_storage, use_case_id, kind, version)
+    except ValueError as e:
+        return jsonify(str(e)), 400
+    return _send_stored(path, mimetype, version)
+
+def _profile_file(use_case_id):
+    ## where the DataRobot calls of the last build went, see build_profile
+    return graph_file(local_storage, use_case_id, "profile")
+
+def _stream_file(use_case_id, job_id = None):
+    ## NDJSON records of the last successful build, or of the build job_id while it runs
+    if job_id is None:
+        return graph_file(local_storage, use_case_id, "stream")
+    return job_stream_file(local_storage, use_case_id, job_id)
+
 @app.route("/getUseCaseGraph", methods = ["GET"])
 @cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
 def build_use_case_graph():
+    """Start (or join) a background build of the use case graph and return its job id.
+
+    Poll /getUseCaseGraphStatus?jobId= for progress. refresh=true re-crawls a stored graph,
+    only resolving assets that changed since it was built. wait=true blocks until the build
+    is finished, like this endpoint used to. maxDepth, includeLabels, excludeLabels and
+    modelSummary limit what the build resolves, see BuildOptions and /expandNode. While a
+    build with other options (or an expansion) runs for the use case, it answers 409.
+    """
     use_case_id = request.args.get("useCaseId")
-    edge_output_file = os.path.join(local_storage,f"{use_case_id}_edges.json")
-    node_output_file = os.path.join(local_storage,f"{use_case_id}_nodes.json")
-    if Path(edge_output_file).exists():
-        pass
-    else:
+    refresh = request.args.get("refresh", "false").lower() == "true"
+    wait = request.args.get("wait", "false").lower() == "true"
+    try:
+        options = _build_options()
+    except ValueError as e:
+        return jsonify(f"invalid build options: {e}"), 400
+    refresh = refresh or _stored_options_differ(use_case_id, options)
+    if current_version(local_storage, use_case_id) is not None and not refresh and graph_jobs.active(use_case_id) is None:
+        return jsonify(dict(jobId = None, useCaseId = use_case_id, status = "done", message = f"use case {use_case_id} retrieved successfully"))
+    headers = request.headers 
+    token = headers.get('token', "").replace("Bearer ", "")
+    endpoint = headers.get("endpoint")
+    job, created = graph_jobs.submit(use_case_id, _build_use_case_graph(use_case_id, token, endpoint, refresh, options), _job_options(options))
+    if not created and job.options != _job_options(options):
+        return _busy(use_case_id, job)
+    if wait:
+        job.done.wait()
+        if job.status == "failed":
+            return jsonify(job.error)
+        return jsonify(f"use case {use_case_id} retrieved successfully")
+    status = job.to_dict()
+    status["message"] = f"graph build {'started' if created else 'already running'} for use case {use_case_id}"
+    return jsonify(status), 202
+
+@app.route("/getUseCaseGraphStream", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def stream_use_case_graph():
+    """Stream the use case graph as NDJSON node and edge records while it is being built.
+
+    Starts (or joins) a build like /getUseCaseGraph when there is no stored graph or
+    refresh=true, otherwise streams the stored records. The last record is of type end,
+    or error if the build failed. Takes the build options of /getUseCaseGraph.
+    """
+    use_case_id = request.args.get("useCaseId")
+    refresh = request.args.get("refresh", "false").lower() == "true"
+    try:
+        options = _build_options()
+    except ValueError as e:
+        return jsonify(f"invalid build options: {e}"), 400
+    refresh = refresh or _stored_options_differ(use_case_id, options)
+    job = graph_jobs.active(use_case_id)
+    if job is None and (refresh or not Path(_stream_file(use_case_id)).exists()):
         headers = request.headers 
         token = headers.get('token', "").replace("Bearer ", "")
         endpoint = headers.get("endpoint")
-        try:
-            client = dr.Client(token=token, endpoint=endpoint)
-            nodes, edges = build_graph(client, use_case_id)
-            write_edges(use_case_id, edges, edge_output_file)
-            write_nodes(use_case_id, nodes, node_output_file)
-        except Exception as e:
-            return jsonify(f"{str(e)}")
-    return jsonify(f"use case {use_case_id} retrieved successfully")
+        job, _ = graph_jobs.submit(use_case_id, _build_use_case_graph(use_case_id, token, endpoint, refresh, options), _job_options(options))
+    if job is not None and job.options != _job_options(options):
+        return _busy(use_case_id, job)
+    if job is None:
+        return _send_graph_file(use_case_id, "stream", "application/x-ndjson")
+    records = follow_build(job, _stream_file(use_case_id, job.id), lambda: _stream_file(use_case_id))
+    return Response(records, mimetype = "application/x-ndjson", headers = {"X-Accel-Buffering": "no"})
+
+@app.route("/expandNode", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def expand_use_case_node():
+    """Resolve the parents of an expandable node of a stored graph and merge them into it.
+
+    ?useCaseId=&nodeId=[&depth=1][&includeLabels=][&excludeLabels=], depth is how many levels
+    of ancestry to resolve (all for the rest of it). Returns the nodes that were added or
+    replaced and the new edges, the stored graph files are rewritten with them. Runs as a
+    graph job of the use case, so it fails with 409 while the use case is being built.
+    """
+    use_case_id = request.args.get("useCaseId")
+    node_id = request.args.get("nodeId")
+    depth = request.args.get("depth", "1")
+    try:
+        options = _build_options() or BuildOptions()
+        options = BuildOptions(max_depth = None if depth == "all" else int(depth),
+                               include_labels = options.include_labels, exclude_labels = options.exclude_labels)
+        if options.max_depth == 0:
+            raise ValueError("depth has to be at least 1")
+    except ValueError as e:
+        return jsonify(f"invalid build options: {e}"), 400
+    previous_nodes, _ = load_previous(local_storage, use_case_id)
+    if previous_nodes is None:
+        return jsonify(f"use case {use_case_id} has no stored graph, build it first"), 404
+    node = next((n for n in previous_nodes if n["id"] == node_id), None)
+    if node is None:
+        return jsonify(f"node {node_id} not found in use case {use_case_id}"), 404
+    if not node.get("expandable"):
+        return jsonify(dict(nodeId = node_id, nodes = [], edges = []))
+    headers = request.headers
+    token = headers.get('token', "").replace("Bearer ", "")
+    endpoint = headers.get("endpoint")
+    expansion = {}
+
+    def expand(job):
+        with build_lock(local_storage, use_case_id, owner = dict(jobId = job.id)):
+            ## the stored graph is read again, a build or expansion may have finished in between
+            nodes, edges, manifest = load_graph(local_storage, use_case_id)
+            stored = next((n for n in nodes if n["id"] == node_id), None)
+            if stored is None or not stored.get("expandable"):
+                expansion.update(nodes = [], edges = [])
+                return
+            with client_pool.lease(token, endpoint) as client:
+                job.profile.endpoint = client.endpoint
+                expanded_nodes, expanded_edges = expand_node(client, stored, use_case_id, options = options,
+                                                             asset_cache = asset_cache, profile = job.profile)
+            changed, added = merge_expansion(nodes, edges, expanded_nodes, expanded_edges)
+            store_graph(local_storage, use_case_id, nodes, edges, manifest, global_index = global_index)
+        expansion.update(nodes = changed, edges = added)
+
+    job, created = graph_jobs.submit(use_case_id, expand, dict(expandNode = node_id))
+    if not created:
+        return jsonify(f"use case {use_case_id} is being built, expand the node once job {job.id} is done"), 409
+    job.done.wait()
+    if job.status == "failed":
+        return jsonify(job.error), 500
+    return jsonify(dict(nodeId = node_id, **expansion))
+
+@app.route("/getCompactGraph", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_compact_graph():
+    use_case_id = request.args.get("useCaseId")
+    return _send_graph_file(use_case_id, "compact", "application/octet-stream")
+
+@app.route("/getUseCaseGraphStatus", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_use_case_graph_status():
+    ## by jobId, or the build currently running for useCaseId
+    job_id = request.args.get("jobId")
+    if job_id:
+        status = graph_jobs.status(job_id)
+    else:
+        job = graph_jobs.active(request.args.get("useCaseId"))
+        status = job.to_dict() if job is not None else None
+    if status is None:
+        return jsonify(dict(jobId = job_id, status = "unknown")), 404
+    return jsonify(status)
+
+@app.route("/getBuildProfile", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_build_profile():
+    """Where the time of a build went: top endpoints, calls per resolver and asset type, cache hits.
+
+    Live for jobId (or the build running for useCaseId), otherwise the profile stored
+    beside the graph by its last build. top is the number of endpoints and roots listed.
+    """
+    job_id = request.args.get("jobId")
+    use_case_id = request.args.get("useCaseId")
+    try:
+        top = _int_arg("top", 10)
+    except ValueError as e:
+        return jsonify(f"invalid top: {e}"), 400
+    job = graph_jobs.get(job_id) if job_id else graph_jobs.active(use_case_id)
+    if job is not None:
+        profile = job.profile.summary(top = top)
+        profile.update(jobId = job.id, useCaseId = job.use_case_id, status = job.status)
+        return jsonify(profile)
+    if job_id:
+        return jsonify(dict(jobId = job_id, status = "unknown")), 404
+    return _send_stored(_profile_file(use_case_id), "application/json")
 
 @app.route("/getEdges", methods = ["GET"])
 @cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
 def get_edges():
     use_case_id = request.args.get("useCaseId")
-    with open(os.path.join(local_storage,f"{use_case_id}_edges.json"), "r") as f:
-        edges = json.load(f)
-    return jsonify(edges)   
+    return _send_graph_file(use_case_id, "edges", "application/json")
 
 @app.route("/getNodes", methods = ["GET"])
 @cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
 def get_nodes():
     use_case_id = request.args.get("useCaseId")
-    with open(os.path.join(local_storage, f"{use_case_id}_nodes.json"), "r") as f:
-        nodes = json.load(f)
-    return jsonify(nodes)
+    return _send_graph_file(use_case_id, "nodes", "application/json")
+
+def _int_arg(name, default = None):
+    ## a query parameter of 0 or more, ValueError for anything else
+    value = request.args.get(name)
+    if not value:
+        return default
+    value = int(value)
+    if value < 0:
+        raise ValueError(f"{name} has to be 0 or more, not {value}")
+    return value
+
+def _lineage(direction):
+    ## ?useCaseId=&nodeId=[&depth=][&labels=a,b] against the stored graph of the use case
+    use_case_id = request.args.get("useCaseId")
+    node_id = request.args.get("nodeId")
+    try:
+        depth = _int_arg("depth")
+    except ValueError as e:
+        return jsonify(f"invalid depth: {e}"), 400
+    labels = request.args.get("labels")
+    version = current_version(local_storage, use_case_id)
+    node_output_file = graph_file(local_storage, use_case_id, "nodes", version)
+    edge_output_file = graph_file(local_storage, use_case_id, "edges", version)
+    if version is None or not (Path(node_output_file).exists() and Path(edge_output_file).exists()):
+        return jsonify(f"use case {use_case_id} has no stored graph, build it first"), 404
+    index = lineage_indexes.get(node_output_file, edge_output_file)
+    if node_id not in index:
+        return jsonify(f"node {node_id} not found in use case {use_case_id}"), 404
+    walk = index.ancestors if direction == "ancestors" else index.descendants
+    return jsonify(walk(node_id, max_depth = depth, labels = set(labels.split(",")) if labels else None))
+
+@app.route("/getAncestors", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_ancestors():
+    ## what feeds this node
+    return _lineage("ancestors")
+
+@app.route("/getDescendants", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_descendants():
+    ## what is affected if this node changes
+    return _lineage("descendants")
+
+@app.route("/getGlobalLineage", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_global_lineage():
+    """Ancestors or descendants of an asset across every stored use case graph.
+
+    Start from nodeId, or from every node matching assetId (and assetVersionId / label).
+    direction is ancestors (default) or descendants, depth and labels work like /getAncestors.
+    """
+    direction = request.args.get("direction", "ancestors")
+    if direction not in ("ancestors", "descendants"):
+        return jsonify(f"unknown direction {direction}"), 400
+    try:
+        depth = _int_arg("depth")
+    except ValueError as e:
+        return jsonify(f"invalid depth: {e}"), 400
+    labels = request.args.get("labels")
+    node_ids = global_index.find(node_id = request.args.get("nodeId"), asset_id = request.args.get("assetId"),
+                                 asset_version_id = request.args.get("assetVersionId"), label = request.args.get("label"))
+    if not node_ids:
+        return jsonify("no matching node in the lineage index"), 404
+    return jsonify(global_index.lineage(node_ids, direction = direction, max_depth = depth,
+                                        labels = set(labels.split(",")) if labels else None))
+
+@app.route("/getGlobalIndexStats", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_global_index_stats():
+    return jsonify(global_index.stats())
+
+@app.route("/getAssetCacheStats", methods = ["GET"])
+@cross_origin(origins = ["http://127.0.0.1:3000", "http://localhost:3000", "http://0.0.0.0:3000"])
+def get_asset_cache_stats():
+    return jsonify(asset_cache.stats())
 
 if __name__ == '__main__':
+    ## development server, one process. serve with gunicorn -c gunicorn.conf.py app:app in production
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
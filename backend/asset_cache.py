@@ -0,0 +1,146 @@
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from prefetch import list_all
+from build_profile import record_cache
+
+## persistent cache used by the graph build currently running in this context, see build_graph
+current_asset_cache = contextvars.ContextVar("lineage_asset_cache", default = None)
+
+## seconds an entry of each asset type stays valid, None never expires.
+## dataset and registered model versions are immutable once created, everything else can be edited.
+DEFAULT_TTLS = {
+    "datasetVersion": None,
+    "registeredModelVersion": None,
+    "datastore": 24 * 60 * 60,
+    "datasource": 24 * 60 * 60,
+    "recipe": 60 * 60,
+    "customModelVersions": 10 * 60,
+    "registeredModelVersions": 10 * 60,
+    "deployment": 5 * 60,
+}
+DEFAULT_MAX_ENTRIES = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    namespace TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    asset_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, asset_type, asset_id, version)
+);
+CREATE INDEX IF NOT EXISTS assets_accessed_at ON assets (accessed_at);
+"""
+
+
+class AssetCache:
+    """SQLite backed cache of DataRobot API payloads shared across graph builds.
+
+    Entries are namespaced by endpoint and token (see cache_namespace), expire per asset type (see DEFAULT_TTLS) and the
+    least recently used ones are evicted once the cache holds more than max_entries.
+    """
+
+    def __init__(self, path, max_entries = DEFAULT_MAX_ENTRIES, ttls = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread = False, timeout = 30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.hits = Counter()
+        self.misses = Counter()
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, namespace, asset_type, asset_id, version = None):
+        key = (namespace, asset_type, asset_id, version or "")
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM assets WHERE namespace = ? AND asset_type = ? AND asset_id = ? AND version = ?", key).fetchone()
+            if row is None:
+                self.misses[asset_type] += 1
+                return None
+            payload, created_at = row
+            ttl = self.ttls.get(asset_type, 0)
+            if ttl is not None and now - created_at > ttl:
+                self._conn.execute("DELETE FROM assets WHERE namespace = ? AND asset_type = ? AND asset_id = ? AND version = ?", key)
+                self.expired += 1
+                self.misses[asset_type] += 1
+                return None
+            self._conn.execute(
+                "UPDATE assets SET accessed_at = ? WHERE namespace = ? AND asset_type = ? AND asset_id = ? AND version = ?", (now, *key))
+            self.hits[asset_type] += 1
+        return json.loads(payload)
+
+    def put(self, namespace, asset_type, asset_id, payload, version = None):
+        if self.ttls.get(asset_type, 0) == 0:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (namespace, asset_type, asset_id, version or "", json.dumps(payload), now, now))
+            self._evict()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        ## trim to 90% so we are not evicting on every single insert once full
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM assets WHERE rowid IN (SELECT rowid FROM assets ORDER BY accessed_at LIMIT ?)", (excess,))
+        self.evicted += excess
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM assets")
+
+    def stats(self):
+        with self._lock:
+            by_type = dict(self._conn.execute("SELECT asset_type, COUNT(*) FROM assets GROUP BY asset_type").fetchall())
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            types = sorted(set(by_type) | set(self.hits) | set(self.misses))
+            return dict(path = self.path,
+                        entries = sum(by_type.values()),
+                        max_entries = self.max_entries,
+                        size_bytes = page_count * page_size,
+                        hits = sum(self.hits.values()),
+                        misses = sum(self.misses.values()),
+                        expired = self.expired,
+                        evicted = self.evicted,
+                        by_type = {t: dict(entries = by_type.get(t, 0), hits = self.hits[t], misses = self.misses[t], ttl = self.ttls.get(t, 0)) for t in types})
+
+
+def cache_namespace(client):
+    ## DataRobot checks access per user, a payload is only served back to the token that fetched it
+    token = getattr(client, "token", None) or ""
+    return f"{client.endpoint}#{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def cached_get(client, asset_type, path, asset_id, version = None, paginated = False):
+    """client.get(path).json(), served from the active AssetCache when there is one.
+
+    paginated list endpoints are fetched in full and returned as {"data": [...]}.
+    """
+    def fetch():
+        return dict(data = list_all(client, path)) if paginated else client.get(path).json()
+    asset_cache = current_asset_cache.get()
+    if asset_cache is None:
+        return fetch()
+    namespace = cache_namespace(client)
+    payload = asset_cache.get(namespace, asset_type, asset_id, version)
+    record_cache("asset_cache", asset_type, payload is not None)
+    if payload is None:
+        payload = fetch()
+        asset_cache.put(namespace, asset_type, asset_id, payload, version)
+    return payload
@@ -0,0 +1,186 @@
+"""Build the lineage graphs of many use cases at once, e.g. to pre-warm them nightly.
+
+    python batch_build.py                                        # every use case the token can see
+    python batch_build.py --use-case-ids 65a1... 65b2...
+    python batch_build.py --use-case-file use_case_list.json     # as written by create_use_case_file.py
+
+Use cases are built by a pool of processes writing to the same storage directory as app.py,
+sharing its asset cache and global lineage index. Builds take the same lock as the server
+(see graph_store.build_lock), so the two never build one use case at the same time. At most
+--max-concurrent-requests DataRobot requests are in flight across all processes, and
+--requests-per-second is split between them. A use case whose listings still match the
+manifest of its stored graph is skipped (see manifest_current), one that changed is refreshed
+incrementally. --max-depth, --include-labels, --exclude-labels and --model-summary limit what
+is resolved, like the options of /getUseCaseGraph. Per use case timings and failures are
+written to --summary-file.
+"""
+import argparse
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import datarobot as dr
+from dotenv import load_dotenv
+
+from asset_cache import AssetCache, DEFAULT_MAX_ENTRIES
+from build_options import BuildOptions
+from build_profile import BuildProfile
+from client_pool import ClientPool
+from create_graph_from_use_case import DEFAULT_MAX_WORKERS, crawl_graph, manifest_current
+from global_index import GlobalLineageIndex
+from graph_store import build_lock, job_stream_file, load_previous, store_graph
+from rate_limit import DEFAULT_MAX_REQUESTS_PER_SECOND, DEFAULT_REQUESTS_PER_SECOND
+
+load_dotenv(override = True)
+script_path = Path(__file__).parent.absolute()
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROCESSES = 4
+DEFAULT_MAX_CONCURRENT_REQUESTS = 16
+
+## state of a worker process, set by _init_worker
+_worker = {}
+_client_pool = None
+
+
+def lease_client(token, endpoint, pool_maxsize, requests_per_second, max_requests_per_second, concurrency):
+    """The default client factory of a worker process: its own pooled client for token/endpoint."""
+    global _client_pool
+    if _client_pool is None:
+        _client_pool = ClientPool(pool_maxsize = pool_maxsize, requests_per_second = requests_per_second,
+                                  max_requests_per_second = max_requests_per_second, concurrency = concurrency)
+    return _client_pool.lease(token, endpoint)
+
+
+def _init_worker(client_factory, concurrency, storage, max_workers, deadline_seconds, write_profiles, options):
+    _worker.update(client_factory = client_factory, concurrency = concurrency, storage = storage, max_workers = max_workers,
+                   deadline_seconds = deadline_seconds, write_profiles = write_profiles, options = options,
+                   asset_cache = AssetCache(os.path.join(storage, "asset_cache.sqlite"), max_entries = int(os.environ.get("ASSET_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))),
+                   global_index = GlobalLineageIndex(os.path.join(storage, "lineage_index.sqlite")))
+
+
+def build_use_case(use_case_id, force = False):
+    """Build (or skip) one use case in a worker process and return its summary entry."""
+    storage = _worker["storage"]
+    result = dict(useCaseId = use_case_id, status = None, seconds = None, nodes = None, edges = None, apiCalls = None, retries = None, error = None)
+    start = time.perf_counter()
+    stream_file = job_stream_file(storage, use_case_id, f"batch{os.getpid()}")
+    try:
+        with build_lock(storage, use_case_id, owner = dict(batch = True)), _worker["client_factory"](_worker["concurrency"]) as client:
+            previous_nodes, previous_manifest = load_previous(storage, use_case_id)
+            if not force and previous_manifest is not None and manifest_current(client, use_case_id, previous_manifest, max_workers = _worker["max_workers"], options = _worker["options"]):
+                result.update(status = "skipped", seconds = round(time.perf_counter() - start, 3))
+                return result
+            profile = BuildProfile(client.endpoint)
+            nodes, edges, manifest = crawl_graph(client, use_case_id, max_workers = _worker["max_workers"], asset_cache = _worker["asset_cache"],
+                                                 previous_nodes = previous_nodes, previous_manifest = previous_manifest, stream_to = stream_file,
+                                                 profile = profile, deadline_seconds = _worker["deadline_seconds"], options = _worker["options"])
+            summary = profile.summary()
+            store_graph(storage, use_case_id, nodes, edges, manifest, stream_file = stream_file, global_index = _worker["global_index"],
+                        profile = summary if _worker["write_profiles"] else None)
+        result.update(status = "refreshed" if previous_manifest is not None else "built", nodes = len(nodes), edges = len(edges),
+                      apiCalls = summary["api_calls"], retries = summary["retries"])
+    except Exception as e:
+        logger.error("use case %s failed: %s", use_case_id, e)
+        result.update(status = "failed", error = f"{type(e).__name__}: {e}", traceback = traceback.format_exc())
+        if os.path.exists(stream_file):
+            os.remove(stream_file)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def read_use_case_file(path):
+    ## a json list of ids or of {"id": ...} (create_use_case_file.py), or one id per line
+    with open(path, "r") as f:
+        text = f.read()
+    try:
+        entries = json.loads(text)
+    except ValueError:
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    return [e["id"] if isinstance(e, dict) else e for e in entries]
+
+
+def run_batch(use_case_ids, client_factory, storage, processes = DEFAULT_PROCESSES, max_concurrent_requests = DEFAULT_MAX_CONCURRENT_REQUESTS,
+              max_workers = DEFAULT_MAX_WORKERS, deadline_seconds = None, write_profiles = True, force = False, options = None):
+    """Build use_case_ids across processes and return the batch summary.
+
+    client_factory(concurrency) is called in the worker processes and returns a context
+    manager yielding a client whose requests hold the concurrency semaphore, see lease_client.
+    options are the BuildOptions of every build, None for full graphs.
+    """
+    started_at = time.time()
+    concurrency = multiprocessing.BoundedSemaphore(max_concurrent_requests)
+    results = {}
+    with ProcessPoolExecutor(max_workers = processes, initializer = _init_worker,
+                             initargs = (client_factory, concurrency, storage, max_workers, deadline_seconds, write_profiles, options)) as executor:
+        futures = {executor.submit(build_use_case, use_case_id, force): use_case_id for use_case_id in use_case_ids}
+        for i, future in enumerate(as_completed(futures), 1):
+            use_case_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                ## the worker process itself died
+                result = dict(useCaseId = use_case_id, status = "failed", error = f"{type(e).__name__}: {e}")
+            results[use_case_id] = result
+            logger.info("[%d/%d] use case %s %s in %ss", i, len(futures), use_case_id, result["status"], result.get("seconds"))
+    ordered = [results[use_case_id] for use_case_id in use_case_ids]
+    counts = {status: sum(r["status"] == status for r in ordered) for status in ("built", "refreshed", "skipped", "failed")}
+    return dict(startedAt = started_at, finishedAt = time.time(), seconds = round(time.time() - started_at, 3),
+                useCases = len(ordered), processes = processes, maxConcurrentRequests = max_concurrent_requests,
+                **counts, failures = [r for r in ordered if r["status"] == "failed"], results = ordered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--use-case-ids", nargs = "*", default = None, help = "use cases to build, default every use case from dr.UseCase.list()")
+    parser.add_argument("--use-case-file", default = None, help = "json list of use cases (or ids), or one id per line")
+    parser.add_argument("--storage", default = os.environ.get("GRAPH_STORAGE", os.path.join(script_path, "storage")),
+                        help = "where graphs are stored, GRAPH_STORAGE as for app.py by default")
+    parser.add_argument("--processes", type = int, default = DEFAULT_PROCESSES, help = "use cases built at the same time")
+    parser.add_argument("--max-workers", type = int, default = DEFAULT_MAX_WORKERS, help = "concurrent requests within one build")
+    parser.add_argument("--max-concurrent-requests", type = int, default = DEFAULT_MAX_CONCURRENT_REQUESTS, help = "DataRobot requests in flight across all processes")
+    parser.add_argument("--requests-per-second", type = float, default = DEFAULT_REQUESTS_PER_SECOND, help = "rate to start at across all processes")
+    parser.add_argument("--max-requests-per-second", type = float, default = DEFAULT_MAX_REQUESTS_PER_SECOND, help = "rate never exceeded across all processes")
+    parser.add_argument("--deadline-seconds", type = float, default = None, help = "fail a use case still building after this long")
+    parser.add_argument("--max-depth", type = int, default = None, help = "levels of ancestry to resolve below the assets of each use case")
+    parser.add_argument("--include-labels", nargs = "*", default = None, help = "only resolve nodes with these labels")
+    parser.add_argument("--exclude-labels", nargs = "*", default = None, help = "do not resolve nodes with these labels")
+    parser.add_argument("--model-summary", action = "store_true", help = "one summary node per project leaderboard instead of a node per model")
+    parser.add_argument("--force", action = "store_true", help = "rebuild use cases even when they are unchanged")
+    parser.add_argument("--no-profiles", action = "store_true", help = "don't write {useCaseId}_profile.json files")
+    parser.add_argument("--summary-file", default = None, help = "default batch_summary.json in the storage directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level = logging.INFO, format = "%(asctime)s %(levelname)s %(processName)s %(name)s: %(message)s")
+    client = dr.Client()
+    if args.use_case_file:
+        use_case_ids = read_use_case_file(args.use_case_file)
+    elif args.use_case_ids:
+        use_case_ids = args.use_case_ids
+    else:
+        use_case_ids = [u.id for u in dr.UseCase.list()]
+    ## duplicates would build the same use case twice at the same time
+    use_case_ids = list(dict.fromkeys(use_case_ids))
+    os.makedirs(args.storage, exist_ok = True)
+    options = BuildOptions(args.max_depth, args.include_labels, args.exclude_labels, args.model_summary)
+    client_factory = functools.partial(lease_client, client.token, client.endpoint, args.max_workers,
+                                       args.requests_per_second / args.processes, args.max_requests_per_second / args.processes)
+    summary = run_batch(use_case_ids, client_factory, args.storage, processes = args.processes, max_concurrent_requests = args.max_concurrent_requests,
+                        max_workers = args.max_workers, deadline_seconds = args.deadline_seconds, write_profiles = not args.no_profiles, force = args.force,
+                        options = None if options.is_default else options)
+    summary_file = args.summary_file or os.path.join(args.storage, "batch_summary.json")
+    with open(summary_file, "w") as f:
+        f.write(json.dumps(summary, indent = 2))
+    print(f"{summary['useCases']} use cases in {summary['seconds']}s: {summary['built']} built, {summary['refreshed']} refreshed, "
+          f"{summary['skipped']} skipped, {summary['failed']} failed. summary written to {summary_file}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+"""Benchmark build_graph against replayed DataRobot responses, no account needed.
+
+Runs the crawl on synthetic use cases of several sizes (see synthetic_use_case), or on
+fixture files recorded from a real crawl with `create_graph_from_use_case.py --record`,
+through replay.ReplayClient with a simulated per-request latency. Reports wall time, API
+calls and the peak memory traced during the build.
+
+--api-rate-limit and --error-rate make the replayed API answer 429s and 503s. The crawl goes
+through rate_limit.throttle unless --no-throttle, placeholders counts the nodes that came out
+as failure placeholders (should be 0 when throttled).
+
+--model-summary builds with BuildOptions(model_summary = True), compare against a default run
+to see what one node per project leaderboard saves on projects with many models.
+
+    python benchmarks/bench_build_graph.py --sizes 5 20 80 --latency 0.02
+    python benchmarks/bench_build_graph.py --sizes 20 --api-rate-limit 100 --error-rate 0.02
+    python benchmarks/bench_build_graph.py --sizes 20 --models-per-project 200 --model-summary
+    python benchmarks/bench_build_graph.py --fixtures storage/my_use_case.fixtures.json
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from build_options import BuildOptions  # noqa: E402
+from create_graph_from_use_case import DEFAULT_MAX_WORKERS, build_graph  # noqa: E402
+from replay import ReplayClient, load_fixtures  # noqa: E402
+from rate_limit import DEFAULT_MAX_REQUESTS_PER_SECOND, RateLimiter, throttle  # noqa: E402
+from synthetic_use_case import synthetic_use_case  # noqa: E402
+
+
+def run(responses, use_case_id, args, trace = False):
+    client = ReplayClient(responses, latency = args.latency, jitter = args.jitter, seed = 0,
+                          rate_limit = args.api_rate_limit, error_rate = args.error_rate)
+    if not args.no_throttle:
+        throttle(client, RateLimiter(args.requests_per_second, max(args.requests_per_second, DEFAULT_MAX_REQUESTS_PER_SECOND)))
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        nodes, edges = build_graph(client, use_case_id, max_workers = args.max_workers, prefetch = not args.no_prefetch,
+                                   options = BuildOptions(model_summary = args.model_summary))
+    except Exception as e:
+        ## an unthrottled crawl against a rate limited API can fail outright
+        print(f"build failed: {type(e).__name__}: {e}")
+        nodes, edges = [], []
+    seconds = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return dict(nodes = len(nodes), edges = len(edges), calls = client.replay.total_calls,
+                missing = sum(client.replay.missing.values()), seconds = seconds, peak = peak,
+                failed = client.replay.throttled + client.replay.errors, placeholders = sum("note" in n for n in nodes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [5, 20, 80], help = "number of projects per synthetic use case")
+    parser.add_argument("--models-per-project", type = int, default = 10)
+    parser.add_argument("--recipe-depth", type = int, default = 3)
+    parser.add_argument("--fan-in", type = int, default = 2)
+    parser.add_argument("--fixtures", nargs = "*", default = [], help = "recorded fixture files to run instead of synthetic use cases")
+    parser.add_argument("--latency", type = float, default = 0.02, help = "simulated seconds per request")
+    parser.add_argument("--jitter", type = float, default = 0.0, help = "extra random seconds per request, up to")
+    parser.add_argument("--max-workers", type = int, default = DEFAULT_MAX_WORKERS)
+    parser.add_argument("--no-prefetch", action = "store_true")
+    parser.add_argument("--api-rate-limit", type = float, default = None, help = "requests per second the replayed API answers before 429s")
+    parser.add_argument("--error-rate", type = float, default = 0.0, help = "share of requests the replayed API answers with a 503")
+    parser.add_argument("--requests-per-second", type = float, default = 1000.0, help = "rate the crawl's rate limiter starts at")
+    parser.add_argument("--no-throttle", action = "store_true", help = "send requests straight to the replayed API")
+    parser.add_argument("--model-summary", action = "store_true", help = "one summary node per project leaderboard")
+    args = parser.parse_args()
+
+    cases = []
+    for path in args.fixtures:
+        fixtures = load_fixtures(path)
+        cases.append((os.path.basename(path), fixtures["use_case_id"], fixtures["responses"]))
+    if not args.fixtures:
+        for size in args.sizes:
+            use_case_id, responses = synthetic_use_case(projects = size, models_per_project = args.models_per_project,
+                                                        recipe_depth = args.recipe_depth, fan_in = args.fan_in, seed = size)
+            cases.append((f"{size} projects", use_case_id, responses))
+
+    print(f"{'case':>24} {'nodes':>7} {'edges':>7} {'calls':>6} {'missing':>7} {'429/503':>7} {'placeholders':>12} {'seconds':>8} {'peak MB':>8}")
+    for name, use_case_id, responses in cases:
+        timed = run(responses, use_case_id, args)
+        ## tracemalloc slows everything down, measure memory on a separate run
+        traced = run(responses, use_case_id, args, trace = True)
+        print(f"{name:>24} {timed['nodes']:>7} {timed['edges']:>7} {timed['calls']:>6} {timed['missing']:>7} "
+              f"{timed['failed']:>7} {timed['placeholders']:>12} {timed['seconds']:8.2f} {traced['peak'] / 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
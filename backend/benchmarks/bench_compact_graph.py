@@ -0,0 +1,72 @@
+"""Benchmark loading stored graphs as JSON against the compact format.
+
+Writes synthetic graphs (see bench_graph_assembly) as the nodes/edges JSON files and as a
+compact graph, then times and measures the peak memory of loading the topology (node ids and
+edges) from each. The compact graph is converted back to JSON to check it round trips.
+
+    python benchmarks/bench_compact_graph.py --sizes 1000 10000 100000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from create_graph_from_use_case import assemble_graph, write_edges, write_nodes  # noqa: E402
+from compact_graph import CompactGraph, write_compact  # noqa: E402
+from bench_graph_assembly import synthetic_graph  # noqa: E402
+
+
+def load_json(node_file, edge_file):
+    with open(node_file, "r") as f:
+        nodes = json.load(f)
+    with open(edge_file, "r") as f:
+        edges = json.load(f)
+    return [n["id"] for n in nodes], edges
+
+
+def load_compact(path):
+    graph = CompactGraph.load(path)
+    graph.ids
+    return graph
+
+
+def measure(fn, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'json MB':>8} {'lgc MB':>7} {'json s':>7} {'lgc s':>7} {'json peak MB':>12} {'lgc peak MB':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            nodes, edges = assemble_graph(synthetic_graph(size))
+            node_file, edge_file, compact_file = (os.path.join(tmp, f"{size}{suffix}") for suffix in ("_nodes.json", "_edges.json", ".lgc"))
+            write_nodes(None, nodes, node_file)
+            write_edges(None, edges, edge_file)
+            write_compact(nodes, edges, compact_file)
+            assert CompactGraph.load(compact_file).to_json() == (nodes, edges), "compact graph does not round trip"
+
+            _, json_seconds, json_peak = measure(load_json, node_file, edge_file)
+            _, compact_seconds, compact_peak = measure(load_compact, compact_file)
+            json_mb = (os.path.getsize(node_file) + os.path.getsize(edge_file)) / 1e6
+            print(f"{len(nodes):>8} {json_mb:8.1f} {os.path.getsize(compact_file) / 1e6:7.1f} {json_seconds:7.3f} {compact_seconds:7.3f} "
+                  f"{json_peak / 1e6:12.1f} {compact_peak / 1e6:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
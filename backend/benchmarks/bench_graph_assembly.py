@@ -0,0 +1,132 @@
+"""Benchmark assemble_graph on synthetic lineage graphs.
+
+Builds nested node trees shaped like a crawl result (datastores -> datasources -> datasets ->
+projects -> models -> registered models -> deployments, with shared ancestors) and times the
+flattening into nodes/edges. The pre-rewrite implementation is kept here for comparison; it is
+quadratic, so it only runs up to --legacy-max nodes and its output is checked against the new one.
+
+    python benchmarks/bench_graph_assembly.py --sizes 1000 10000 100000
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from create_graph_from_use_case import assemble_graph  # noqa: E402
+
+## share of nodes per label, in dependency order
+SHAPE = [("datastore", 0.01), ("datasource", 0.04), ("datasets", 0.2), ("projects", 0.1),
+         ("models", 0.5), ("registeredModels", 0.1), ("deployments", 0.05)]
+## labels listed directly by the use case, i.e. the top level nodes
+TOP_LEVEL = {"datasets", "projects", "models", "registeredModels", "deployments"}
+
+
+def synthetic_graph(size, seed = 0, fan_in = 2):
+    """Top level nodes for a graph of roughly `size` nodes, ancestors shared like crawl_cache does."""
+    rnd = random.Random(seed)
+    layers = []
+    top = []
+    for label, share in SHAPE:
+        layer = []
+        for i in range(max(1, int(size * share))):
+            node = dict(assetId = f"{label}-{i}", label = label, name = f"{label} {i}",
+                        url = f"https://app.datarobot.com/{label}/{i}")
+            if label == "datasets":
+                node["assetVersionId"] = f"v{i}"
+            parents = []
+            if layers:
+                for _ in range(rnd.randint(1, fan_in)):
+                    parents.append(rnd.choice(rnd.choice(layers[-2:])))
+            node["parents"] = parents
+            layer.append(node)
+            if label in TOP_LEVEL:
+                ## resolvers hand out shallow copies of cached nodes
+                top.append(dict(node))
+        layers.append(layer)
+    return top
+
+
+def legacy_assemble_graph(nodes):
+    nodes = [n for n in nodes if n]
+
+    def define_id(node, parents):
+        parents = [p for p in parents if p and p.get("assetId")]
+        node["id"] = node["assetId"] + "-" + node["assetVersionId"] if node.get("assetVersionId") else node["assetId"]
+        for parent in parents:
+            define_id(parent, parent.get("parents", []))
+
+    for node in nodes:
+        define_id(node, node.get("parents", []))
+    for node in nodes:
+        node["parents"] = [p for p in node.get("parents", []) if p is not None and p.get("assetId") is not None]
+    node_ids = [n["id"] for n in nodes]
+    for node in nodes:
+        node["color"] = "red"
+
+    def add_parents_as_nodes(node, parents):
+        for parent in parents:
+            if parent is not None:
+                if id := parent.get("id"):
+                    if id not in node_ids:
+                        nodes.append(parent)
+                        node_ids.append(id)
+                add_parents_as_nodes(parent, parent.get("parents", []))
+
+    for node in copy.deepcopy(nodes):
+        add_parents_as_nodes(node, node.get("parents", []))
+    edges = []
+    for node in nodes:
+        for parent in node.get("parents", []) or []:
+            try:
+                edges.append({"from": parent["id"], "to": node["id"]})
+            except Exception:
+                pass
+    for i, node in enumerate(nodes):
+        nodes[i] = copy.deepcopy(node)
+    for node in nodes:
+        for parent in node.get("parents", []):
+            try:
+                del parent["parents"]
+            except Exception:
+                pass
+    return (nodes, edges)
+
+
+def timed(fn, *args):
+    ## keep the cyclic gc out of the timing, it scales with everything allocated so far
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type = int, default = 2000, help = "largest size to run the legacy implementation on")
+    parser.add_argument("--fan-in", type = int, default = 2)
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(10000)
+    print(f"{'size':>8} {'nodes':>8} {'edges':>8} {'seconds':>9} {'us/node':>8} {'legacy s':>9}")
+    for size in args.sizes:
+        (nodes, edges), seconds = timed(assemble_graph, synthetic_graph(size, fan_in = args.fan_in))
+        legacy = ""
+        if size <= args.legacy_max:
+            (legacy_nodes, legacy_edges), legacy_seconds = timed(legacy_assemble_graph, synthetic_graph(size, fan_in = args.fan_in))
+            assert json.dumps(legacy_nodes) == json.dumps(nodes) and legacy_edges == edges, "output differs from legacy"
+            legacy = f"{legacy_seconds:9.3f}"
+        print(f"{size:>8} {len(nodes):>8} {len(edges):>8} {seconds:9.3f} {seconds / len(nodes) * 1e6:8.2f} {legacy:>9}")
+
+
+if __name__ == "__main__":
+    main()
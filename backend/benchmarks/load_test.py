@@ -0,0 +1,201 @@
+"""Load test the graph server: /getNodes, /getEdges and /getUseCaseGraph hammered concurrently.
+
+Readers fetch /getNodes and then /getEdges of the same snapshot (?version= from the
+X-Graph-Version header) and check every edge connects nodes of that snapshot, while
+builders keep rebuilding the use case, alternating modelSummary so consecutive snapshots
+differ. Reports throughput and latency per endpoint, and fails on any torn or mismatched read.
+--unpinned reads the edges of whatever snapshot is current instead, to see what a client
+ignoring X-Graph-Version gets.
+
+Without --url it needs no account: a synthetic use case (see synthetic_use_case) is written
+to a fixture file and --servers app processes serve it from a shared temporary storage
+directory (GRAPH_REPLAY_FILE, GRAPH_STORAGE), each on its own port like gunicorn workers
+behind a balancer. With --url it runs against a server that is already up, e.g.
+
+    GRAPH_REPLAY_FILE=fixtures.json gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/load_test.py --url http://127.0.0.1:5001 --use-case-id 000000000000000000000007
+
+    python benchmarks/load_test.py --servers 4 --concurrency 32 --seconds 20
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_use_case import synthetic_use_case  # noqa: E402
+
+
+def _serve(port, storage, replay_file):
+    ## one app process, configured through the environment it reads at import
+    os.environ.update(GRAPH_STORAGE = storage, GRAPH_REPLAY_FILE = replay_file, GRAPH_REQUESTS_PER_SECOND = "1000",
+                      GRAPH_MAX_REQUESTS_PER_SECOND = "1000", GRAPH_WRITE_PROFILE = "false")
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import logging
+    logging.disable(logging.WARNING)
+    from werkzeug.serving import make_server
+    from app import app
+    make_server("127.0.0.1", port, app, threaded = True).serve_forever()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_servers(n, storage, replay_file):
+    """Start n app processes sharing storage and return (urls, processes)."""
+    context = multiprocessing.get_context("spawn")
+    ports = [_free_port() for _ in range(n)]
+    processes = [context.Process(target = _serve, args = (port, storage, replay_file), daemon = True) for port in ports]
+    for p in processes:
+        p.start()
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    for url, p in zip(urls, processes):
+        for _ in range(300):
+            if not p.is_alive():
+                raise RuntimeError(f"server {url} exited with {p.exitcode}")
+            try:
+                requests.get(f"{url}/ping", timeout = 1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"server {url} did not start")
+    return urls, processes
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.checked = 0
+        self.inconsistent = []
+        self.torn = []
+        self.gone = 0
+        self.builds = 0
+        self._lock = threading.Lock()
+
+    def request(self, session, name, url, **kwargs):
+        start = time.perf_counter()
+        response = session.get(url, timeout = 120, **kwargs)
+        with self._lock:
+            self.latencies[name].append(time.perf_counter() - start)
+            self.statuses[name][response.status_code] += 1
+        return response
+
+
+def reader(urls, use_case_id, stats, stop, pinned = True):
+    session = requests.Session()
+    for url in itertools.cycle(random.sample(urls, len(urls))):
+        if stop.is_set():
+            return
+        nodes = stats.request(session, "getNodes", f"{url}/getNodes", params = dict(useCaseId = use_case_id))
+        version = nodes.headers.get("X-Graph-Version")
+        ## the edges may come from another server process, pinned to the same snapshot
+        edges = stats.request(session, "getEdges", f"{random.choice(urls)}/getEdges", params = dict(useCaseId = use_case_id, version = version if pinned else None))
+        if nodes.status_code != 200 or edges.status_code != 200:
+            with stats._lock:
+                stats.gone += 1
+            continue
+        try:
+            node_ids = {n["id"] for n in nodes.json()}
+            dangling = [e for e in edges.json() if e["from"] not in node_ids or e["to"] not in node_ids]
+        except ValueError as e:
+            with stats._lock:
+                stats.torn.append(f"{version}: {e}")
+            continue
+        with stats._lock:
+            stats.checked += 1
+            if dangling:
+                stats.inconsistent.append(f"{version}: {len(dangling)} edges without their nodes, e.g. {dangling[0]}")
+
+
+def builder(urls, use_case_id, stats, stop, interval):
+    session = requests.Session()
+    for i in itertools.count():
+        if stop.wait(interval):
+            return
+        ## other options than the stored graph force a rebuild
+        stats.request(session, "getUseCaseGraph", f"{random.choice(urls)}/getUseCaseGraph",
+                      params = dict(useCaseId = use_case_id, modelSummary = "true" if i % 2 else "false"))
+        with stats._lock:
+            stats.builds += 1
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", nargs = "*", default = None, help = "servers to test, default start --servers local ones")
+    parser.add_argument("--use-case-id", default = None, help = "use case to request with --url")
+    parser.add_argument("--servers", type = int, default = 4, help = "local server processes sharing one storage directory")
+    parser.add_argument("--projects", type = int, default = 20, help = "size of the synthetic use case")
+    parser.add_argument("--models-per-project", type = int, default = 20)
+    parser.add_argument("--concurrency", type = int, default = 16, help = "reader threads")
+    parser.add_argument("--builders", type = int, default = 2, help = "threads requesting rebuilds")
+    parser.add_argument("--build-interval", type = float, default = 0.5, help = "seconds between the rebuild requests of a builder")
+    parser.add_argument("--seconds", type = float, default = 15)
+    parser.add_argument("--unpinned", action = "store_true", help = "read /getEdges of whatever snapshot is current, mismatches are expected")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.url:
+        urls, use_case_id = args.url, args.use_case_id
+    else:
+        tmp = tempfile.mkdtemp(prefix = "lineage-load-test-")
+        use_case_id, responses = synthetic_use_case(projects = args.projects, models_per_project = args.models_per_project, seed = 7)
+        replay_file = os.path.join(tmp, "fixtures.json")
+        with open(replay_file, "w") as f:
+            json.dump(dict(use_case_id = use_case_id, responses = responses), f)
+        urls, processes = start_servers(args.servers, os.path.join(tmp, "storage"), replay_file)
+        print(f"{args.servers} servers sharing {tmp}/storage")
+    try:
+        first = requests.get(f"{urls[0]}/getUseCaseGraph", params = dict(useCaseId = use_case_id, wait = "true"), timeout = 600)
+        first.raise_for_status()
+
+        stats, stop = Stats(), threading.Event()
+        threads = [threading.Thread(target = reader, args = (urls, use_case_id, stats, stop, not args.unpinned)) for _ in range(args.concurrency)]
+        threads += [threading.Thread(target = builder, args = (urls, use_case_id, stats, stop, args.build_interval)) for _ in range(args.builders)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        seconds = time.perf_counter() - start
+    finally:
+        if tmp is not None:
+            for p in processes:
+                p.terminate()
+            shutil.rmtree(tmp, ignore_errors = True)
+
+    print(f"{'endpoint':>16} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for name, latencies in sorted(stats.latencies.items()):
+        print(f"{name:>16} {len(latencies):>9} {len(latencies) / seconds:8.1f} {_percentile(latencies, 0.5) * 1e3:8.1f} "
+              f"{_percentile(latencies, 0.95) * 1e3:8.1f} {_percentile(latencies, 0.99) * 1e3:8.1f}  {dict(stats.statuses[name])}")
+    print(f"{stats.checked} node/edge pairs checked, {len(stats.inconsistent)} inconsistent, {len(stats.torn)} torn, "
+          f"{stats.gone} missing snapshots, {stats.builds} rebuild requests")
+    for problem in (stats.inconsistent + stats.torn)[:5]:
+        print("  " + problem)
+    return 1 if stats.inconsistent or stats.torn else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
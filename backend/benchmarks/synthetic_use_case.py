@@ -0,0 +1,190 @@
+"""Fabricate DataRobot API responses for a use case of any size, to replay with replay.ReplayClient.
+
+The use case gets datasets built by chains of recipes over shared datasources, projects
+trained on those datasets, models, registered models and deployments, custom model versions,
+and playgrounds with LLM blueprints over vector databases. Projects, datasets and datasources
+are shared between many of the assets downstream of them, like in a real account.
+
+    from synthetic_use_case import synthetic_use_case
+    use_case_id, responses = synthetic_use_case(projects = 20, models_per_project = 10)
+"""
+import json
+import random
+
+CREATED = "2024-01-01T00:00:00.000000Z"
+
+
+def _page(items):
+    return dict(count = len(items), next = None, previous = None, totalCount = len(items), data = items)
+
+
+def synthetic_use_case(projects = 10, models_per_project = 5, datasets = None, recipe_depth = 3, fan_in = 2,
+                       datastores = 3, datasources = 8, registered_models = None, deployments = None,
+                       custom_models = 2, playgrounds = 2, seed = 0):
+    """(use_case_id, {request key: response}) for a synthetic use case.
+
+    recipe_depth is the length of the recipe chains datasets are wrangled through, and fan_in
+    the number of inputs each recipe and the number of upstream datasets each project draws from.
+    """
+    rnd = random.Random(seed)
+    datasets = projects if datasets is None else datasets
+    registered_models = max(1, projects // 2) if registered_models is None else registered_models
+    deployments = registered_models if deployments is None else deployments
+    ## shaped like a DataRobot object id, the only use case ids app.py accepts
+    use_case_id = f"{seed:024x}"
+    responses = {}
+
+    def put(path, payload, status = 200):
+        responses[f"GET {path}"] = dict(status = status, body = json.dumps(payload))
+
+    ## data connections
+    store_ids = [f"store{i:04d}" for i in range(datastores)]
+    stores = [dict(id = s, canonicalName = f"store {s}", driverClassType = rnd.choice(["snowflake", "postgres", "bigquery"]))
+              for s in store_ids]
+    sources = [dict(id = f"source{i:04d}", canonicalName = f"source {i}", params = dict(dataStoreId = rnd.choice(store_ids)))
+               for i in range(datasources)]
+    put("externalDataStores/", _page(stores))
+    put("externalDataSources/", _page(sources))
+    for s in stores:
+        put(f"externalDataStores/{s['id']}", s)
+    for s in sources:
+        put(f"externalDataSources/{s['id']}", s)
+
+    ## datasets, each the output of a chain of recipe_depth recipes over datasources and earlier datasets
+    dataset_versions = []
+    recipe_entries = []
+
+    def add_dataset(i, recipe_id = None, source_id = None):
+        dataset_id, version_id = f"dataset{i:05d}", f"dsver{i:05d}"
+        payload = dict(datasetId = dataset_id, versionId = version_id, name = f"dataset {i}", categories = ["TRAINING"],
+                       creationDate = CREATED, isDataEngineEligible = True, isLatestVersion = True, isSnapshot = True,
+                       processingState = "COMPLETED", recipeId = recipe_id, dataSourceId = source_id)
+        put(f"datasets/{dataset_id}/versions/{version_id}", payload)
+        put(f"datasets/{dataset_id}/", payload)
+        dataset_versions.append((dataset_id, version_id))
+        return dataset_id, version_id
+
+    recipe_count = 0
+    for i in range(datasets):
+        upstream = None
+        for depth in range(recipe_depth):
+            recipe_id = f"recipe{recipe_count:05d}"
+            recipe_count += 1
+            inputs = [dict(inputType = "datasource", dataSourceId = s["id"], dataStoreId = s["params"]["dataStoreId"])
+                      for s in rnd.sample(sources, min(fan_in, len(sources)))]
+            if upstream is not None:
+                inputs[0] = dict(inputType = "dataset", datasetId = upstream[0], datasetVersionId = upstream[1])
+            elif dataset_versions and rnd.random() < 0.5:
+                shared = rnd.choice(dataset_versions)
+                inputs[0] = dict(inputType = "dataset", datasetId = shared[0], datasetVersionId = shared[1])
+            put(f"recipes/{recipe_id}", dict(recipeId = recipe_id, name = f"recipe {recipe_id}", inputs = inputs))
+            if depth < recipe_depth - 1:
+                upstream = add_dataset(len(dataset_versions), recipe_id = recipe_id)
+            else:
+                recipe_entries.append(recipe_id)
+        if recipe_depth:
+            add_dataset(len(dataset_versions), recipe_id = recipe_id)
+        else:
+            add_dataset(len(dataset_versions), source_id = rnd.choice(sources)["id"])
+    ## the use case lists its final datasets, the intermediate ones show up as ancestors
+    listed_datasets = dataset_versions[recipe_depth - 1::recipe_depth] if recipe_depth else dataset_versions
+
+    ## projects and their models
+    project_ids = [f"project{i:05d}" for i in range(projects)]
+    model_ids = {}
+    for i, pid in enumerate(project_ids):
+        dataset_id, version_id = rnd.choice(listed_datasets)
+        put(f"projects/{pid}/", dict(id = pid, projectName = f"project {i}", catalogId = dataset_id, catalogVersionId = version_id,
+                                      stage = "modeling", created = CREATED, partition = dict(cvMethod = "random")))
+        records = []
+        for j in range(models_per_project):
+            mid = f"{pid}m{j:04d}"
+            family = rnd.choice(["GBM", "GLM", "NN", "RF"])
+            record = dict(id = mid, projectId = pid, modelType = f"{family} model {j % 7}", modelCategory = "model", modelNumber = j,
+                          modelFamily = family, blueprintId = f"bp{j % 13}", metrics = {}, isFrozen = False, isStarred = False,
+                          isTrainedIntoValidation = False, isTrainedIntoHoldout = False, processes = [], featurelistName = "Informative Features")
+            records.append(record)
+            put(f"projects/{pid}/models/{mid}/", record)
+        model_ids[pid] = [r["id"] for r in records]
+        put(f"projects/{pid}/modelRecords/", _page(records))
+
+    ## custom models
+    custom = []
+    for i in range(custom_models):
+        cm_id = f"custom{i:04d}"
+        versions = [dict(id = f"{cm_id}v{k}", label = f"v{k}.0") for k in range(3)]
+        put(f"customModels/{cm_id}/versions", _page(versions))
+        custom.append((cm_id, versions))
+
+    ## registered models, most from project models and some from custom models, sharing projects
+    registered = []
+    version_list = {}
+    for i in range(registered_models):
+        rm_id = f"regmodel{i:05d}"
+        versions = []
+        for k in range(rnd.randint(1, 3)):
+            version_id = f"{rm_id}v{k}"
+            if custom and rnd.random() < 0.2:
+                cm_id, cm_versions = rnd.choice(custom)
+                source_meta = dict(projectId = None, customModelDetails = dict(id = cm_id, versionLabel = rnd.choice(cm_versions)["label"]))
+                model_id = None
+            else:
+                pid = rnd.choice(project_ids)
+                source_meta = dict(projectId = pid)
+                model_id = rnd.choice(model_ids[pid])
+            version = dict(id = version_id, name = f"{rm_id} version {k}", registeredModelId = rm_id, modelId = model_id, sourceMeta = source_meta)
+            put(f"registeredModels/{rm_id}/versions/{version_id}", version)
+            versions.append(version)
+        put(f"registeredModels/{rm_id}/versions", _page(versions))
+        version_list[rm_id] = versions
+        registered.append(dict(id = rm_id, name = f"registered model {i}", versions = [dict(id = v["id"]) for v in versions]))
+
+    deployment_entries = []
+    for i in range(deployments):
+        rm = rnd.choice(registered)
+        version = rnd.choice(version_list[rm["id"]])
+        dep_id = f"deployment{i:05d}"
+        payload = dict(id = dep_id, label = f"deployment {i}", description = None, defaultPredictionServer = None,
+                       model = dict(id = version["modelId"] or version["id"], type = "model", targetName = "target", projectId = version["sourceMeta"]["projectId"]),
+                       modelPackage = dict(id = version["id"], name = version["name"], registeredModelId = rm["id"]),
+                       capabilities = {}, predictionUsage = dict(dailyRates = [], lastPredictionTimestamp = None),
+                       permissions = [], serviceHealth = {}, modelHealth = {}, accuracyHealth = {}, importance = "LOW",
+                       createdAt = CREATED)
+        put(f"deployments/{dep_id}/", payload)
+        deployment_entries.append(payload)
+    put("deployments/", _page(deployment_entries))
+
+    ## playgrounds with LLM blueprints over vector databases
+    vdb_entries = []
+    playground_entries = []
+    for i in range(playgrounds):
+        vdb_id = f"vdb{i:04d}"
+        dataset_id, _ = rnd.choice(listed_datasets)
+        put(f"genai/vectorDatabases/{vdb_id}/", dict(
+            id = vdb_id, name = f"vector database {i}", size = 1024, useCaseId = use_case_id, datasetId = dataset_id,
+            chunksCount = 10, creationDate = CREATED, creationUserId = "user", organizationId = "org", tenantId = "tenant",
+            lastUpdateDate = CREATED, executionStatus = "COMPLETED", playgroundsCount = 1, datasetName = f"dataset {dataset_id}",
+            userName = "user", source = "DataRobot", validationId = None, errorMessage = None, embeddingModel = "jinaai/jina-embedding-t-en-v1",
+            chunkingMethod = "recursive", chunkSize = 256, chunkOverlapPercentage = 0, separators = [], isSeparatorRegex = False,
+            embeddingValidationId = None, familyId = vdb_id, parentId = None, version = 1, skippedChunksCount = 0,
+            customChunking = False, metadataColumns = [], metadataCombinationStrategy = "replace", addedDatasetIds = [], addedDatasetNames = [],
+            embeddingRegisteredModelId = None, deploymentStatus = None, addedMetadataDatasetPairs = []))
+        vdb_entries.append(dict(id = vdb_id, name = f"vector database {i}"))
+        playground_id = f"playground{i:04d}"
+        blueprints = [dict(id = f"{playground_id}bp{k}", name = f"blueprint {k}", vectorDatabaseId = vdb_id,
+                           llmId = rnd.choice(["azure-openai-gpt-4", "amazon-titan"]), llmName = "llm") for k in range(2)]
+        put(f"genai/llmBlueprints/?playgroundId={playground_id}", _page(blueprints))
+        playground_entries.append(dict(id = playground_id, name = f"playground {i}"))
+
+    listings = dict(
+        applications = [], customApplications = [], notebooks = [],
+        data = [dict(entityType = "RECIPE", entityId = r) for r in recipe_entries],
+        datasets = [dict(datasetId = d, versionId = v, name = f"dataset {d}") for d, v in listed_datasets],
+        deployments = [dict(id = d["id"], label = d["label"]) for d in deployment_entries],
+        playgrounds = playground_entries,
+        projects = [dict(projectId = pid, name = f"project {pid}") for pid in project_ids],
+        registeredModels = registered,
+        vectorDatabases = vdb_entries)
+    for listing, items in listings.items():
+        put(f"useCases/{use_case_id}/{listing}", _page(items))
+    return use_case_id, responses
@@ -0,0 +1,133 @@
+import contextvars
+import functools
+import inspect
+
+from crawl_cache import current_variant
+
+## options of the graph build running in this context, None resolves everything, see crawl_graph
+current_options = contextvars.ContextVar("lineage_build_options", default = None)
+## depth of the node about to be resolved in this context, top level assets are at 0
+current_depth = contextvars.ContextVar("lineage_node_depth", default = 0)
+
+## what node resolvers return instead of a node they were told not to resolve
+DEFERRED = object()  # beyond max_depth, its child is marked expandable
+SKIPPED = object()  # filtered out by label
+
+## node resolvers by name, for expanding a node later from its "expand" entry
+EXPANDERS = {}
+
+
+class BuildOptions:
+    """What a graph build resolves. The defaults resolve the complete ancestry of everything.
+
+    max_depth limits how many levels of ancestry are resolved below the top level assets
+    (0 resolves only the assets of the use case). Nodes at the limit that have parents are
+    kept without them, flagged "expandable", and carry an "expand" entry to resolve them
+    later (see create_graph_from_use_case.expand_node). include_labels and exclude_labels
+    filter the nodes resolved by label, anything behind a filtered node is not resolved either.
+    model_summary resolves the leaderboard of each project to one expandable "modelSummary"
+    node instead of a node per model, models referenced by registered models are still resolved.
+    """
+
+    def __init__(self, max_depth = None, include_labels = None, exclude_labels = None, model_summary = False):
+        if max_depth is not None and max_depth < 0:
+            raise ValueError(f"max_depth has to be 0 or more, not {max_depth}")
+        self.max_depth = max_depth
+        self.include_labels = set(include_labels) if include_labels else None
+        self.exclude_labels = set(exclude_labels) if exclude_labels else set()
+        self.model_summary = model_summary
+
+    def wants(self, label):
+        ## placeholders of failed lookups have no label, they are kept like in a full build
+        if label is None:
+            return True
+        return label not in self.exclude_labels and (self.include_labels is None or label in self.include_labels)
+
+    def wants_any(self, labels):
+        return any(self.wants(label) for label in labels)
+
+    @property
+    def is_default(self):
+        return self.max_depth is None and self.include_labels is None and not self.exclude_labels and not self.model_summary
+
+    def to_dict(self):
+        ## only what differs from the defaults, so manifests of full builds don't change
+        d = {}
+        if self.max_depth is not None:
+            d["maxDepth"] = self.max_depth
+        if self.include_labels is not None:
+            d["includeLabels"] = sorted(self.include_labels)
+        if self.exclude_labels:
+            d["excludeLabels"] = sorted(self.exclude_labels)
+        if self.model_summary:
+            d["modelSummary"] = True
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(max_depth = d.get("maxDepth"), include_labels = d.get("includeLabels"), exclude_labels = d.get("excludeLabels"),
+                   model_summary = d.get("modelSummary", False))
+
+
+def node_resolver(*labels):
+    """Apply the BuildOptions of the current build to a resolver returning nodes of labels.
+
+    Goes outside @memoized. A resolver at the max depth still resolves its node, but the
+    resolvers it calls for parents return DEFERRED without fetching anything, and the node
+    comes back expandable. Resolvers can return a node or a list of nodes at the same depth.
+    """
+    def decorator(resolver):
+        signature = inspect.signature(resolver)
+        ## memoized resolvers cache nodes resolved at the depth limit under their own key
+        memoized = hasattr(resolver, "__wrapped__")
+
+        @functools.wraps(resolver)
+        def wrapper(client, *args, **kwargs):
+            options = current_options.get()
+            if options is None:
+                return resolver(client, *args, **kwargs)
+            if not options.wants_any(labels):
+                return SKIPPED
+            depth = current_depth.get()
+            if options.max_depth is not None and depth > options.max_depth:
+                return DEFERRED
+            leaf = options.max_depth is not None and depth == options.max_depth
+            depth_token = current_depth.set(depth + 1)
+            variant_token = current_variant.set("leaf" if leaf and memoized else None)
+            try:
+                result = resolver(client, *args, **kwargs)
+            finally:
+                current_variant.reset(variant_token)
+                current_depth.reset(depth_token)
+            if not leaf:
+                expand = None
+            else:
+                bound = signature.bind(client, *args, **kwargs)
+                bound.apply_defaults()
+                expand = dict(resolver = resolver.__name__, args = {k: v for k, v in bound.arguments.items() if k != "client"})
+            if isinstance(result, list):
+                return [node for node in (_prune(n, options, expand) for n in result) if node is not SKIPPED]
+            return _prune(result, options, expand)
+        EXPANDERS[resolver.__name__] = wrapper
+        return wrapper
+    return decorator
+
+
+def _prune(node, options, expand):
+    ## drop the parents a node was not supposed to resolve. expand is set for nodes at the depth limit
+    if not isinstance(node, dict):
+        return node
+    if not options.wants(node.get("label")):
+        return SKIPPED
+    parents = node.get("parents")
+    if not parents:
+        return node
+    if expand is not None:
+        node["parents"] = []
+        if any(p is DEFERRED or (isinstance(p, dict) and options.wants(p.get("label"))) for p in parents):
+            node["expandable"] = True
+            node["expand"] = expand
+    else:
+        node["parents"] = [p for p in parents if p is not SKIPPED and p is not DEFERRED
+                           and not (isinstance(p, dict) and not options.wants(p.get("label")))]
+    return node
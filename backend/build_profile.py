@@ -0,0 +1,167 @@
+import contextlib
+import contextvars
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+## profile of the graph build running in this context, see crawl_graph
+current_profile = contextvars.ContextVar("lineage_build_profile", default = None)
+## resolvers currently running in this context, innermost last, see resolving
+current_resolvers = contextvars.ContextVar("lineage_resolvers", default = ())
+## top level asset being resolved in this context, see crawl_graph
+current_root = contextvars.ContextVar("lineage_root", default = None)
+
+DEFAULT_TOP = 10
+_ID_SEGMENT = re.compile(r"\d")
+
+
+@contextlib.contextmanager
+def resolving(name, asset_type = None):
+    """Attribute DataRobot calls made inside the block to resolver name (and asset_type)."""
+    token = current_resolvers.set(current_resolvers.get() + ((name, asset_type or name),))
+    try:
+        yield
+    finally:
+        current_resolvers.reset(token)
+
+
+@contextlib.contextmanager
+def resolving_root(key):
+    token = current_root.set(key)
+    try:
+        yield
+    finally:
+        current_root.reset(token)
+
+
+def endpoint_template(url, endpoint):
+    """Request path relative to the API root with ids replaced, e.g. projects/{id}/models/{id}/."""
+    path = urlsplit(url).path
+    root = urlsplit(endpoint).path.rstrip("/") + "/" if endpoint else "/"
+    path = path[len(root):] if path.startswith(root) else path.lstrip("/")
+    ## DataRobot ids are hex object ids, anything with a digit in it is treated as one
+    return "/".join("{id}" if _ID_SEGMENT.search(segment) else segment for segment in path.split("/"))
+
+
+class BuildProfile:
+    """Every DataRobot call and cache lookup of one graph build, see summary()."""
+
+    def __init__(self, endpoint = None):
+        self.endpoint = endpoint
+        self.calls = []
+        self.cache = defaultdict(Counter)
+        self.errors = Counter()
+        self.started_at = time.time()
+        self.finished_at = None
+        self.crawl_cache_stats = None
+        self._lock = threading.Lock()
+
+    def record_call(self, response):
+        start = time.perf_counter()
+        size = len(response.content)
+        seconds = response.elapsed.total_seconds() + (time.perf_counter() - start)
+        ## urllib3 connect retries, plus 429/5xx retries made by rate_limit.ThrottledAdapter
+        retries = len(getattr(getattr(response.raw, "retries", None), "history", None) or ()) + getattr(response, "throttle_retries", 0)
+        resolvers = current_resolvers.get()
+        call = dict(endpoint = endpoint_template(response.request.url, self.endpoint), method = response.request.method,
+                    status = response.status_code, seconds = seconds, bytes = size, retries = retries,
+                    resolver = resolvers[-1][0] if resolvers else None, asset_type = resolvers[-1][1] if resolvers else None, depth = len(resolvers), root = current_root.get())
+        with self._lock:
+            self.calls.append(call)
+        return response
+
+    def record_cache(self, layer, asset_type, hit):
+        with self._lock:
+            self.cache[layer]["hits" if hit else "misses", asset_type] += 1
+
+    def record_error(self, resolver, error):
+        with self._lock:
+            self.errors[resolver, type(error).__name__] += 1
+
+    def finish(self, crawl_cache_stats = None):
+        self.finished_at = time.time()
+        self.crawl_cache_stats = crawl_cache_stats
+
+    def summary(self, top = DEFAULT_TOP):
+        with self._lock:
+            calls = list(self.calls)
+            cache = {layer: dict(counts) for layer, counts in self.cache.items()}
+            errors = dict(self.errors)
+        endpoints = defaultdict(lambda: dict(calls = 0, seconds = 0.0, max_seconds = 0.0, bytes = 0, retries = 0, errors = 0))
+        resolvers = defaultdict(lambda: dict(calls = 0, seconds = 0.0, bytes = 0))
+        asset_types = defaultdict(lambda: dict(calls = 0, seconds = 0.0))
+        roots = defaultdict(lambda: dict(calls = 0, seconds = 0.0, depth = 0))
+        for call in calls:
+            e = endpoints[call["method"], call["endpoint"]]
+            e["calls"] += 1
+            e["seconds"] += call["seconds"]
+            e["max_seconds"] = max(e["max_seconds"], call["seconds"])
+            e["bytes"] += call["bytes"]
+            e["retries"] += call["retries"]
+            e["errors"] += call["status"] >= 400
+            r = resolvers[call["resolver"] or "crawl"]
+            r["calls"] += 1
+            r["seconds"] += call["seconds"]
+            r["bytes"] += call["bytes"]
+            a = asset_types[call["asset_type"] or "crawl"]
+            a["calls"] += 1
+            a["seconds"] += call["seconds"]
+            if call["root"] is not None:
+                root = roots[call["root"]]
+                root["calls"] += 1
+                root["seconds"] += call["seconds"]
+                root["depth"] = max(root["depth"], call["depth"])
+        cache_summary = {}
+        for layer, counts in cache.items():
+            by_type = defaultdict(lambda: dict(hits = 0, misses = 0))
+            for (kind, asset_type), n in counts.items():
+                by_type[asset_type][kind] = n
+            cache_summary[layer] = dict(by_type)
+        if self.crawl_cache_stats:
+            cache_summary["crawl_cache"] = self.crawl_cache_stats
+        ## every top level asset is resolved sequentially by one worker, so the slowest one
+        ## bounds the build no matter how many workers there are
+        critical = max(roots.items(), key = lambda kv: kv[1]["seconds"], default = None)
+        end = self.finished_at or time.time()
+        return dict(
+            wall_seconds = round(end - self.started_at, 3),
+            api_calls = len(calls),
+            api_seconds = round(sum(c["seconds"] for c in calls), 3),
+            bytes = sum(c["bytes"] for c in calls),
+            retries = sum(c["retries"] for c in calls),
+            endpoints = [dict(method = m, endpoint = path, **_rounded(v)) for (m, path), v in
+                         sorted(endpoints.items(), key = lambda kv: -kv[1]["seconds"])[:top]],
+            resolvers = {name: _rounded(v) for name, v in sorted(resolvers.items(), key = lambda kv: -kv[1]["seconds"])},
+            asset_types = {name: _rounded(v) for name, v in sorted(asset_types.items(), key = lambda kv: -kv[1]["calls"])},
+            cache = cache_summary,
+            errors = [dict(resolver = r, error = e, count = n) for (r, e), n in sorted(errors.items(), key = lambda kv: -kv[1])],
+            critical_path = dict(root = critical[0], **_rounded(critical[1])) if critical else None,
+            max_depth = max((c["depth"] for c in calls), default = 0),
+            slowest_roots = [dict(root = k, **_rounded(v)) for k, v in sorted(roots.items(), key = lambda kv: -kv[1]["seconds"])[:top]],
+        )
+
+
+def _rounded(stats):
+    return {k: round(v, 4) if isinstance(v, float) else v for k, v in stats.items()}
+
+
+def record_call(response, *args, **kwargs):
+    """requests response hook recording calls against the build running in this context."""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record_call(response)
+    return response
+
+
+def record_cache(layer, asset_type, hit):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record_cache(layer, asset_type, hit)
+
+
+def record_error(resolver, error):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record_error(resolver, error)
@@ -0,0 +1,118 @@
+import contextlib
+import hashlib
+import threading
+import time
+
+import datarobot as dr
+from datarobot.rest import RESTClientObject, TCPKeepAliveAdapter
+from rate_limit import DEFAULT_MAX_REQUESTS_PER_SECOND, DEFAULT_REQUESTS_PER_SECOND, RateLimiter, throttle
+from replay import ReplayClient
+
+DEFAULT_MAX_IDLE_SECONDS = 10 * 60
+DEFAULT_MAX_CLIENTS = 64
+
+
+@contextlib.contextmanager
+def use_client(client):
+    """Make dr.* calls in the current context use client instead of the SDK's global one.
+
+    dr.client.get_client() checks this context variable before the global set by dr.Client,
+    so concurrent requests for different users each see their own client.
+    """
+    token = dr.client._context_client.set(client)
+    try:
+        yield client
+    finally:
+        dr.client._context_client.reset(token)
+
+
+class ClientPool:
+    """Reusable DataRobot clients keyed by (hashed token, endpoint).
+
+    Each client is a requests session with keep-alive connections, sized for
+    pool_maxsize concurrent requests, and rate limited to requests_per_second (adapting to
+    429s up to max_requests_per_second, see rate_limit), with at most concurrency.acquire()
+    requests in flight when a semaphore is given. Clients idle for more than max_idle_seconds, or the
+    least recently used ones beyond max_clients, are closed unless they are leased.
+
+    With replay_file every client serves the responses of that fixture file instead of calling
+    DataRobot (see replay.py), e.g. to load test the server without an account.
+    """
+
+    def __init__(self, pool_maxsize = 10, max_idle_seconds = DEFAULT_MAX_IDLE_SECONDS, max_clients = DEFAULT_MAX_CLIENTS,
+                 requests_per_second = DEFAULT_REQUESTS_PER_SECOND, max_requests_per_second = DEFAULT_MAX_REQUESTS_PER_SECOND, concurrency = None,
+                 replay_file = None):
+        self.pool_maxsize = pool_maxsize
+        self.replay_file = replay_file
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.max_requests_per_second = max_requests_per_second
+        self.max_idle_seconds = max_idle_seconds
+        self.max_clients = max_clients
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _create(self, token, endpoint):
+        if self.replay_file is not None:
+            client = ReplayClient.from_file(self.replay_file)
+            throttle(client, RateLimiter(self.requests_per_second, self.max_requests_per_second), concurrency = self.concurrency)
+            return client
+        client = RESTClientObject(auth = token, endpoint = endpoint, use_tcp_keepalive = True)
+        ## the default adapter keeps 10 connections per host, one per crawl worker is what we want.
+        ## same TCP keep-alive probes as the SDK's own adapter, so idle pooled connections stay up
+        retries = client.get_adapter("https://").max_retries
+        adapter = TCPKeepAliveAdapter(pool_connections = 1, pool_maxsize = self.pool_maxsize, max_retries = retries,
+                                      idle = 300, interval = 60, count = 3)
+        client.mount("https://", adapter)
+        client.mount("http://", adapter)
+        ## one rate limit per token and endpoint, shared by every build using it
+        throttle(client, RateLimiter(self.requests_per_second, self.max_requests_per_second), concurrency = self.concurrency)
+        ## same check dr.Client does, fails fast on a bad token or endpoint
+        client.get("version/")
+        return client
+
+    @contextlib.contextmanager
+    def lease(self, token, endpoint):
+        """Yield the pooled client for token/endpoint, bound for dr.* calls (see use_client)."""
+        key = (hashlib.sha256(token.encode()).hexdigest(), endpoint)
+        with self._lock:
+            self._evict(time.time())
+            entry = self._clients.get(key)
+            if entry is None:
+                ## placeholder so concurrent requests for the same key don't each build a client
+                entry = self._clients[key] = dict(client = None, leases = 0, last_used = time.time(), ready = threading.Event())
+                owner = True
+            else:
+                owner = False
+            entry["leases"] += 1
+        try:
+            if owner:
+                try:
+                    entry["client"] = self._create(token, endpoint)
+                except BaseException:
+                    with self._lock:
+                        self._clients.pop(key, None)
+                    raise
+                finally:
+                    entry["ready"].set()
+            else:
+                entry["ready"].wait()
+                if entry["client"] is None:
+                    raise RuntimeError("could not create DataRobot client")
+            with use_client(entry["client"]) as client:
+                yield client
+        finally:
+            with self._lock:
+                entry["leases"] -= 1
+                entry["last_used"] = time.time()
+
+    def _evict(self, now):
+        idle = [(e["last_used"], k) for k, e in self._clients.items() if e["leases"] == 0]
+        expired = [k for last_used, k in idle if now - last_used > self.max_idle_seconds]
+        overflow = len(self._clients) - len(expired) - self.max_clients
+        if overflow > 0:
+            expired.extend(k for _, k in sorted(i for i in idle if i[1] not in expired)[:overflow])
+        for k in expired:
+            client = self._clients.pop(k)["client"]
+            if client is not None:
+                client.close()
@@ -0,0 +1,266 @@
+"""Compact binary storage for the (nodes, edges) graphs build_graph produces.
+
+Layout, after the 4 byte magic and a length prefixed JSON header:
+
+    strings    interned string table, uint32 offsets followed by the utf-8 blob
+    ids        uint32 string index of every node id
+    labels     uint32 string index of every node label
+    shapes     uint32 index into header["shapes"], the keys of each node in order
+    from, to   uint32 node indexes of every edge
+    columns    one section per node attribute, holding the values of the nodes that have it
+
+The topology (ids, labels, edges) loads straight into arrays. Attribute columns are only
+decoded when they are first asked for. parents, which repeat whole parent nodes, are stored
+as node indexes, with a copy kept only where a parent differs from its stored node.
+Converting JSON -> compact -> JSON gives back the same nodes and edges.
+
+    python compact_graph.py to-compact storage/{id}_nodes.json storage/{id}_edges.json storage/{id}_graph.lgc
+    python compact_graph.py to-json storage/{id}_graph.lgc storage/{id}_nodes.json storage/{id}_edges.json
+"""
+import argparse
+import json
+import struct
+import sys
+from array import array
+
+MAGIC = b"LGC1"
+NONE = 0xFFFFFFFF
+## columns keep this kind when every value fits it, anything else is stored as json
+STR, REFS, JSON = "str", "refs", "json"
+
+
+def _u32(values):
+    a = array("I", values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+
+def _read_u32(buf):
+    a = array("I")
+    a.frombytes(buf)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+class _Strings:
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def __call__(self, s):
+        if s is None:
+            return NONE
+        i = self.index.get(s)
+        if i is None:
+            i = self.index[s] = len(self.values)
+            self.values.append(s)
+        return i
+
+    def encode(self):
+        blobs = [s.encode() for s in self.values]
+        offsets = [0]
+        for b in blobs:
+            offsets.append(offsets[-1] + len(b))
+        return _u32([len(blobs)]) + _u32(offsets) + b"".join(blobs)
+
+
+def _parent_refs(nodes, first):
+    ## parents as node indexes. a parent that is not an exact copy of its stored node (say the
+    ## stored one is a top level node flagged red) is kept as is in extras, referenced past the nodes.
+    offsets, refs, extras, extra_index = [0], [], [], {}
+    for node in nodes:
+        if "parents" not in node:
+            continue
+        for p in node["parents"]:
+            i = first.get(p.get("id"))
+            if i is None or list(p.items()) != [(k, v) for k, v in nodes[i].items() if k != "parents"]:
+                text = json.dumps(p)
+                if text not in extra_index:
+                    extra_index[text] = len(extras)
+                    extras.append(p)
+                i = len(nodes) + extra_index[text]
+            refs.append(i)
+        offsets.append(len(refs))
+    return offsets, refs, extras
+
+
+def encode(nodes, edges):
+    """bytes of the compact form of a nodes/edges pair."""
+    strings = _Strings()
+    first = {}
+    for i, node in enumerate(nodes):
+        first.setdefault(node["id"], i)
+    shapes, shape_index = [], {}
+    node_shapes = []
+    for node in nodes:
+        keys = tuple(node)
+        if keys not in shape_index:
+            shape_index[keys] = len(shapes)
+            shapes.append(list(keys))
+        node_shapes.append(shape_index[keys])
+    try:
+        edge_from = [first[e["from"]] for e in edges]
+        edge_to = [first[e["to"]] for e in edges]
+    except KeyError as e:
+        raise ValueError(f"edge references node {e.args[0]} which is not in the graph")
+
+    sections = [("ids", _u32(strings(n["id"]) for n in nodes)),
+                ("labels", _u32(strings(n.get("label")) if isinstance(n.get("label"), str) or n.get("label") is None else NONE for n in nodes)),
+                ("shapes", _u32(node_shapes)),
+                ("from", _u32(edge_from)),
+                ("to", _u32(edge_to))]
+    columns = {}
+    for key in dict.fromkeys(k for shape in shapes for k in shape):
+        values = [n[key] for n in nodes if key in n]
+        if key == "parents" and all(isinstance(v, list) and all(isinstance(p, dict) for p in v) for v in values):
+            offsets, refs, extras = _parent_refs(nodes, first)
+            kind, data = REFS, _u32([len(offsets), len(refs)]) + _u32(offsets) + _u32(refs) + json.dumps(extras).encode()
+        elif all(v is None or isinstance(v, str) for v in values):
+            kind, data = STR, _u32(strings(v) for v in values)
+        else:
+            kind, data = JSON, json.dumps(values).encode()
+        columns[key] = kind
+        sections.append((f"column:{key}", data))
+    ## the string table is written last since the sections above intern into it
+    sections.insert(0, ("strings", strings.encode()))
+
+    directory, offset = {}, 0
+    for name, data in sections:
+        directory[name] = [offset, len(data)]
+        offset += len(data)
+    header = json.dumps(dict(nodes = len(nodes), edges = len(edges), shapes = shapes, columns = columns, sections = directory)).encode()
+    return b"".join([MAGIC, struct.pack("<I", len(header)), header] + [data for _, data in sections])
+
+
+class CompactGraph:
+    """A graph in the compact format. Topology is decoded on load, attributes on demand."""
+
+    def __init__(self, data):
+        data = memoryview(data)
+        if bytes(data[:4]) != MAGIC:
+            raise ValueError("not a compact lineage graph")
+        (header_size,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(bytes(data[8:8 + header_size]))
+        self._data = data
+        self._base = 8 + header_size
+        self._sections = header["sections"]
+        self.shapes = [tuple(s) for s in header["shapes"]]
+        self.column_kinds = header["columns"]
+        strings = self._section("strings")
+        (count,) = struct.unpack_from("<I", strings, 0)
+        self._string_offsets = _read_u32(strings[4:4 + 4 * (count + 1)])
+        self._string_blob = strings[4 + 4 * (count + 1):]
+        self._strings = [None] * count
+        self.id_indexes = _read_u32(self._section("ids"))
+        self.label_indexes = _read_u32(self._section("labels"))
+        self.node_shapes = _read_u32(self._section("shapes"))
+        self.edge_from = _read_u32(self._section("from"))
+        self.edge_to = _read_u32(self._section("to"))
+        self._columns = {}
+        self._extras = []
+        self._ids = None
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def __len__(self):
+        return len(self.id_indexes)
+
+    def _section(self, name):
+        offset, size = self._sections[name]
+        return self._data[self._base + offset:self._base + offset + size]
+
+    def string(self, i):
+        if i == NONE:
+            return None
+        s = self._strings[i]
+        if s is None:
+            s = self._strings[i] = str(self._string_blob[self._string_offsets[i]:self._string_offsets[i + 1]], "utf-8")
+        return s
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = [self.string(i) for i in self.id_indexes]
+        return self._ids
+
+    def label(self, node):
+        return self.string(self.label_indexes[node])
+
+    def column(self, key):
+        """Values of one attribute, for the nodes that have it, in node order."""
+        if key not in self._columns:
+            kind = self.column_kinds[key]
+            data = self._section(f"column:{key}")
+            if kind == STR:
+                values = [self.string(i) for i in _read_u32(data)]
+            elif kind == REFS:
+                count, size = struct.unpack_from("<II", data, 0)
+                offsets = _read_u32(data[8:8 + 4 * count])
+                refs = _read_u32(data[8 + 4 * count:8 + 4 * (count + size)])
+                self._extras = json.loads(bytes(data[8 + 4 * (count + size):]))
+                values = [refs[offsets[i]:offsets[i + 1]] for i in range(count - 1)]
+            else:
+                values = json.loads(bytes(data))
+            self._columns[key] = values
+        return self._columns[key]
+
+    def to_json(self):
+        """(nodes, edges) as build_graph returns them."""
+        columns = {key: iter(self.column(key)) for key in self.column_kinds}
+        nodes = []
+        for shape in self.node_shapes:
+            keys = self.shapes[shape]
+            nodes.append({k: next(columns[k]) for k in keys})
+        if self.column_kinds.get("parents") == REFS:
+            ## node index references back to copies of the parent nodes, without their parents
+            bases = [{k: v for k, v in n.items() if k != "parents"} for n in nodes] + self._extras
+            for n in nodes:
+                if "parents" in n:
+                    n["parents"] = [dict(bases[i]) for i in n["parents"]]
+        ids = self.ids
+        edges = [{"from": ids[f], "to": ids[t]} for f, t in zip(self.edge_from, self.edge_to)]
+        return nodes, edges
+
+
+def write_compact(nodes, edges, outfile):
+    with open(outfile, "wb") as f:
+        f.write(encode(nodes, edges))
+
+
+def json_to_compact(node_file, edge_file, outfile):
+    with open(node_file, "r") as f:
+        nodes = json.load(f)
+    with open(edge_file, "r") as f:
+        edges = json.load(f)
+    write_compact(nodes, edges, outfile)
+
+
+def compact_to_json(path, node_file, edge_file):
+    nodes, edges = CompactGraph.load(path).to_json()
+    with open(node_file, "w") as f:
+        f.write(json.dumps(nodes))
+    with open(edge_file, "w") as f:
+        f.write(json.dumps(edges))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest = "command", required = True)
+    to_compact = commands.add_parser("to-compact")
+    to_compact.add_argument("node_file")
+    to_compact.add_argument("edge_file")
+    to_compact.add_argument("outfile")
+    to_json = commands.add_parser("to-json")
+    to_json.add_argument("infile")
+    to_json.add_argument("node_file")
+    to_json.add_argument("edge_file")
+    args = parser.parse_args()
+    if args.command == "to-compact":
+        json_to_compact(args.node_file, args.edge_file, args.outfile)
+    else:
+        compact_to_json(args.infile, args.node_file, args.edge_file)
@@ -0,0 +1,86 @@
+import contextvars
+import copy
+import functools
+import inspect
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from build_profile import resolving
+
+## cache of the graph build currently running in this context. build_graph sets it and the
+## worker threads inherit it through the copied context, so resolvers never take it as an argument.
+current_cache = contextvars.ContextVar("lineage_crawl_cache", default = None)
+## memoized resolvers called with a variant set are cached apart from the same call without one,
+## e.g. a node resolved without its parents (see build_options.node_resolver)
+current_variant = contextvars.ContextVar("lineage_memo_variant", default = None)
+
+
+class CrawlCache:
+    """Memoizes asset lookups for the lifetime of one graph build.
+
+    Entries are keyed by (asset type, id, version, ...). Concurrent lookups of the same key
+    wait on the first one instead of fetching again, and failures are cached as well so a
+    broken asset is only requested once.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get_or_resolve(self, key, resolve):
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = Future()
+                self.misses[key[0]] += 1
+            else:
+                self.hits[key[0]] += 1
+        if owner:
+            try:
+                entry.set_result(resolve())
+            except BaseException as e:
+                entry.set_exception(e)
+        return entry.result()
+
+    def stats(self):
+        with self._lock:
+            return dict(hits = sum(self.hits.values()),
+                        misses = sum(self.misses.values()),
+                        entries = len(self._entries),
+                        by_type = {t: dict(hits = self.hits[t], misses = self.misses[t]) for t in sorted(set(self.hits) | set(self.misses))})
+
+
+def memoized(asset_type, *key_args):
+    """Cache a resolver in the current crawl under (asset_type, *key_args).
+
+    key_args name the resolver parameters that identify the asset. dict results are
+    shallow-copied on the way out because build_graph decorates top level nodes in place.
+    """
+    def decorator(resolver):
+        signature = inspect.signature(resolver)
+
+        @functools.wraps(resolver)
+        def wrapper(*args, **kwargs):
+            variant = current_variant.get()
+            def resolve():
+                ## the variant applies to this call only, not to the lookups the resolver makes
+                token = current_variant.set(None)
+                try:
+                    ## calls made by the resolver show up under its name in the build profile
+                    with resolving(resolver.__name__, asset_type):
+                        return resolver(*args, **kwargs)
+                finally:
+                    current_variant.reset(token)
+            cache = current_cache.get()
+            if cache is None:
+                return resolve()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (asset_type, *(bound.arguments[k] for k in key_args)) + ((variant,) if variant else ())
+            result = cache.get_or_resolve(key, resolve)
+            return copy.copy(result) if isinstance(result, dict) else result
+        return wrapper
+    return decorator
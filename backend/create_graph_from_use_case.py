@@ -1,17 +1,44 @@
 import datarobot as dr 
 import itertools
 import argparse 
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
-import pprint
-import copy
 import json
+import hashlib
+import logging
+import threading
+from collections import Counter
 from dotenv import load_dotenv 
+from crawl_cache import CrawlCache, current_cache, memoized
+from asset_cache import cached_get, current_asset_cache
+from prefetch import PrefetchIndex, current_prefetch, list_all, prefetched
+from client_pool import use_client
+from progress import current_progress, record_api_call
+from build_profile import BuildProfile, current_profile, record_call, record_error, resolving, resolving_root
+from graph_stream import write_compressed_variants, write_json_array, write_ndjson
+from replay import Recorder
+from build_options import BuildOptions, SKIPPED, EXPANDERS, current_options, node_resolver
+from rate_limit import BuildDeadlineExceeded, CrawlAborted, DEFAULT_REQUESTS_PER_SECOND, RateLimiter, deadline, throttle
 load_dotenv(override = True)
 script_path = Path(__file__).parent.absolute() 
-print(script_path)
 
+logger = logging.getLogger(__name__)
 URL = "https://app.datarobot.com"
+## upper bound on DataRobot requests in flight during a crawl. each worker resolves one
+## listing or one top level subtree at a time, and walks that subtree sequentially.
+DEFAULT_MAX_WORKERS = 8
+## listing every deployment the user can see only pays off once the use case has a few of them
+PREFETCH_DEPLOYMENTS_MIN = 10
+USE_CASE_LISTINGS = ["applications", "customApplications", "data", "datasets", "deployments",
+                     "notebooks", "playgrounds", "projects", "registeredModels", "vectorDatabases"]
+## labels of the nodes each kind of top level asset (the first part of its key) resolves to
+ROOT_LABELS = dict(datasets = ("datasets",), recipes = ("recipes",), vectorDatabases = ("vectorDatabases",), projects = ("projects",),
+                   models = ("models", "modelSummary"), registeredModels = ("registeredModels", "customRegisteredModels"), deployments = ("deployments",),
+                   llmBlueprints = ("llmBlueprint",), playgrounds = ("playgrounds",))
+## builds starting together can share a pooled client, see attach_build_hooks
+_hooks_lock = threading.Lock()
 
 parser = argparse.ArgumentParser(
     description=__doc__, usage='python %(prog)s <input-file.{csv or json}> <output-file.{csv or json}>'
@@ -25,33 +52,72 @@ parser.add_argument(
 parser.add_argument(
     '--edge-output-file', help='json output of edges', default = "dr_edges.json"
 )
+parser.add_argument(
+    '--max-workers', help='max number of concurrent DataRobot requests', type = int, default = DEFAULT_MAX_WORKERS
+)
+parser.add_argument(
+    '--record', help='save every DataRobot response of the crawl to this fixture file, see replay.py', default = None
+)
+parser.add_argument(
+    '--requests-per-second', help='DataRobot requests per second to start at, lowered whenever the API answers 429', type = float, default = DEFAULT_REQUESTS_PER_SECOND
+)
+parser.add_argument(
+    '--deadline-seconds', help='give up on the crawl after this many seconds instead of waiting out rate limits', type = float, default = None
+)
+parser.add_argument(
+    '--max-depth', help='levels of ancestry to resolve below the assets of the use case, the rest is left expandable', type = int, default = None
+)
+parser.add_argument(
+    '--include-labels', help='only resolve nodes with these labels, e.g. deployments registeredModels', nargs = '*', default = None
+)
+parser.add_argument(
+    '--exclude-labels', help='do not resolve nodes with these labels, e.g. models llm', nargs = '*', default = None
+)
+parser.add_argument(
+    '--model-summary', help='one summary node per project leaderboard instead of a node per model', action = 'store_true'
+)
+parser.add_argument(
+    '--profile-output-file', help='json profile of the DataRobot calls the crawl made, see build_profile.py', default = None
+)
 
+@node_resolver("datastore")
+@memoized("datastore", "datastore_id")
 def get_datastore_node(client, datastore_id, use_case_id):
     try: 
-        resp = client.get(f"externalDataStores/{datastore_id}").json()
+        resp = prefetched("datastore", datastore_id) or cached_get(client, "datastore", f"externalDataStores/{datastore_id}", datastore_id)
         node = dict( assetId = datastore_id, label = "datastore", 
                 name = resp["canonicalName"], driverClassType = resp["driverClassType"],
                 parents = [], url = os.path.join(URL, "account", "data-connections"))
     except Exception as e:
+        _failed("get_datastore_node", datastore_id, e)
         node = dict( assetId = datastore_id, label = "datastore", name = "unknown", parents = [], note = str(e))
     return node
 
+@node_resolver("datasource")
+@memoized("datasource", "datasource_id", "datastore_id")
 def get_datasource_node(client, datasource_id, datastore_id, use_case_id): 
     try:
-        resp = client.get(f"externalDataSources/{datasource_id}").json()
+        resp = prefetched("datasource", datasource_id) or cached_get(client, "datasource", f"externalDataSources/{datasource_id}", datasource_id)
         name = resp["canonicalName"]
         datastore_id = resp["params"]["dataStoreId"] if datastore_id is None else datastore_id
         node = dict(assetId = datasource_id, name = name, label = "datasource", 
                     parents = [get_datastore_node(client, datastore_id, use_case_id)], 
                     url = os.path.join(URL, "account", "data-connections"))
     except Exception as e:
+        _failed("get_datasource_node", datasource_id, e)
         node = dict(assetId = datasource_id, name = "unknown", label = "datasource", 
             parents = [], 
             note = str(e))
     return node
 
+@memoized("recipe", "recipe_id")
+def _get_recipe(client, recipe_id):
+    return cached_get(client, "recipe", f"recipes/{recipe_id}", recipe_id)
+
+@node_resolver("recipes")
+@memoized("recipes", "recipe_id")
 def get_recipe_node(client, recipe_id, use_case_id):
-    resp = client.get(f"recipes/{recipe_id}").json()
+    resp = _get_recipe(client, recipe_id)
     inputs = resp["inputs"]
     parents = []
     for input in inputs:
@@ -63,16 +129,18 @@ def get_recipe_node(client, recipe_id, use_case_id):
     url = os.path.join(URL, "usecases", use_case_id, "wrangler", recipe_id)
     return dict(assetId = recipe_id, label = "recipes", parents = parents, url = url, name = resp["name"])
 
+@node_resolver("datasets")
+@memoized("datasets", "dataset_id", "dataset_version_id")
 def get_dataset_node(client, dataset_id, dataset_version_id = None, use_case_id = None):
     try:
         if dataset_version_id:
             pass
         else:
-            print("no version id provided!! using latest version as default")
-            dataset = dr.Dataset.get(dataset_id)
+            logger.debug("dataset %s: no version id provided, using the latest version", dataset_id)
+            dataset = _get_dataset(dataset_id)
             dataset_version_id = dataset.version_id
             
-        dataset = client.get(f"datasets/{dataset_id}/versions/{dataset_version_id}").json()
+        dataset = cached_get(client, "datasetVersion", f"datasets/{dataset_id}/versions/{dataset_version_id}", dataset_id, dataset_version_id)
         recipe_id = dataset.get("recipeId")
         datasource_id = dataset.get("dataSourceId")
         data_engine_query_id = dataset.get("dataEngineQueryId")
@@ -93,6 +161,7 @@ def get_dataset_node(client, dataset_id, dataset_version_id = None, use_case_id
             url = os.path.join(URL,"ai-catalog",dataset.get("datasetId")),
             parents = parents)
     except Exception as e:
+        _failed("get_dataset_node", dataset_id, e)
         dataset_node = dict(assetId = dataset_id, 
             assetVersionId = dataset_version_id if dataset_version_id else "unknown", 
             label = "datasets", 
@@ -102,29 +171,42 @@ def get_dataset_node(client, dataset_id, dataset_version_id = None, use_case_id
     return dataset_node
     
 
+@node_resolver("vectorDatabases")
+@memoized("vectorDatabases", "vdb_id")
 def get_vectordatabase_node(client, vdb_id, use_case_id):
     try:
         vdb = dr.genai.VectorDatabase.get(vdb_id)
         try:
-            dataset = dr.Dataset.get(vdb.dataset_id)
+            dataset = _get_dataset(vdb.dataset_id)
             dataset_version_id = dataset.version_id ## dataset version id is not available from vdb.
             dataset_node = get_dataset_node(client, dataset.id, dataset_version_id, use_case_id=use_case_id)
             url = os.path.join(URL, "usecases", use_case_id, "vector-databases", vdb.id)
             vdb_node = dict(assetId = vdb.id, label = "vectorDatabases", name = vdb.name, url = url, parents = [dataset_node])
-            # pprint.pprint(vdb_node)
             return vdb_node
         except Exception as e:
-            print(e) 
-            print(vdb_id)
+            _failed("get_vectordatabase_node", f"{vdb_id} dataset", e)
             return None
     except Exception as e:
-        print(vdb_id)
-        print(e)
+        _failed("get_vectordatabase_node", vdb_id, e)
         return None
 
+@memoized("dr.Dataset", "dataset_id")
+def _get_dataset(dataset_id):
+    return dr.Dataset.get(dataset_id)
+
+@memoized("dr.Project", "pid")
+def _get_project(pid):
+    return dr.Project.get(pid)
+
+@memoized("dr.Model", "project_id", "model_id")
+def _get_model(project_id, model_id):
+    return dr.Model.get(project_id, model_id)
+
+@node_resolver("projects")
+@memoized("projects", "pid")
 def get_project_node(client, pid, use_case_id):
     try:
-        project = dr.Project.get(pid)
+        project = _get_project(pid)
         catalog_id = project.catalog_id
         label = "useCases" if catalog_id is None else "datasets"
         id = catalog_id if catalog_id else use_case_id
@@ -141,7 +223,7 @@ def get_project_node(client, pid, use_case_id):
                         ]
                 )
     except Exception as e:
-        print(e)
+        _failed("get_project_node", pid, e)
         return None
     
 def get_model_node(client, dr_model, project_node):
@@ -154,25 +236,94 @@ def get_model_node(client, dr_model, project_node):
                         parents = [project_node])
         return model_node
     except Exception as e:
-        print(e)
+        _failed("get_model_node", getattr(dr_model, "id", None), e)
         return None
         
 
+@node_resolver("models")
 def get_model_nodes(client, pid, use_case_id):
     try:
-        project = dr.Project.get(pid)
+        project = _get_project(pid)
         project_node = get_project_node(client, pid, use_case_id)
         model_nodes = [ get_model_node(client, model, project_node) for model in project.get_model_records()]
         return model_nodes
     except Exception as e:
-        print(e)
+        _failed("get_model_nodes", pid, e)
         return []
 
+def _summarize_models(pid, records, project_node):
+    families = Counter(m.model_family for m in records)
+    types = Counter(m.model_type for m in records)
+    return dict(assetId = pid,
+                label = "modelSummary",
+                name = f"{len(records)} models",
+                url = os.path.join(URL, "projects", pid, "models"),
+                modelCount = len(records),
+                modelFamilies = dict(families.most_common()),
+                modelTypes = dict(types.most_common()),
+                parents = [project_node])
+
+@node_resolver("modelSummary")
+def get_model_summary_node(client, pid, use_case_id):
+    ## the leaderboard of a project as one node, see BuildOptions.model_summary
+    try:
+        project = _get_project(pid)
+        project_node = get_project_node(client, pid, use_case_id)
+        node = _summarize_models(pid, project.get_model_records(), project_node)
+        node.update(expandable = True, expand = dict(resolver = "get_model_summary_models", args = dict(pid = pid, use_case_id = use_case_id)))
+        return node
+    except Exception as e:
+        _failed("get_model_summary_node", pid, e)
+        return None
+
+@node_resolver("modelSummary", "models")
+def get_model_summary_models(client, pid, use_case_id):
+    ## what a model summary expands to, the summary without its expand entry and every model it counts
+    try:
+        project = _get_project(pid)
+        project_node = get_project_node(client, pid, use_case_id)
+        records = project.get_model_records()
+        return [_summarize_models(pid, records, project_node)] + [get_model_node(client, model, project_node) for model in records]
+    except Exception as e:
+        _failed("get_model_summary_models", pid, e)
+        return []
+
+@memoized("customModelVersions", "custom_model_id")
+def _get_custom_model_versions(client, custom_model_id):
+    versions = cached_get(client, "customModelVersions", f"customModels/{custom_model_id}/versions", custom_model_id, paginated = True)
+    if index := current_prefetch.get():
+        index.add("customModelVersion", versions["data"], scope = custom_model_id, name_key = "label")
+    return versions
+
+@memoized("registeredModelVersions", "reg_model_id")
+def _get_registered_model_versions(client, reg_model_id):
+    versions = cached_get(client, "registeredModelVersions", f"registeredModels/{reg_model_id}/versions", reg_model_id, paginated = True)
+    if index := current_prefetch.get():
+        index.add("registeredModelVersion", versions["data"], scope = reg_model_id, name_key = "name")
+    return versions
+
+def _find_version(collection, versions, scope, name_key, name):
+    ## version lists are indexed by name when there is a prefetch index, the last match wins either way
+    if index := current_prefetch.get():
+        version = index.find(collection, name, scope = scope)
+    else:
+        version = ([v for v in versions["data"] if v[name_key] == name] or [None]).pop()
+    if version is None:
+        raise LookupError(f"{scope} has no version with {name_key} {name}")
+    return version
+
+def _get_custom_model_version_by_label(client, custom_model_id, label):
+    return _find_version("customModelVersion", _get_custom_model_versions(client, custom_model_id), custom_model_id, "label", label)
+
+def _get_registered_model_version_by_name(client, reg_model_id, name):
+    return _find_version("registeredModelVersion", _get_registered_model_versions(client, reg_model_id), reg_model_id, "name", name)
+
+@node_resolver("customModels")
+@memoized("customModels", "custom_model_id", "custom_model_version_id", "custom_model_version_label")
 def get_custom_model_version_node(client, custom_model_id, custom_model_version_id = None, custom_model_version_label = None, use_case_id = None):
     try:
         if custom_model_version_label:
-            custom_model_versions = client.get(f"customModels/{custom_model_id}/versions").json()
-            custom_model_version = [cm for cm in custom_model_versions["data"] if cm['label'] == custom_model_version_label].pop()
+            custom_model_version = _get_custom_model_version_by_label(client, custom_model_id, custom_model_version_label)
             custom_model_version_id = custom_model_version["id"]
         elif custom_model_version_id:
             pass
@@ -181,48 +332,59 @@ def get_custom_model_version_node(client, custom_model_id, custom_model_version_
         url = os.path.join(URL, "registry", "custom-model-workshop", custom_model_id, "versions", custom_model_version_id)
         return dict(assetId = custom_model_id, assetVersionId = custom_model_version_id, url = url, label = "customModels", parents = [])
     except Exception as e:
-        print(e)
+        _failed("get_custom_model_version_node", custom_model_id, e)
         return None
 
 
+@node_resolver("registeredModels", "customRegisteredModels")
+@memoized("registeredModels", "reg_model_id", "reg_model_version_id")
 def get_registered_model_node(client, reg_model_id, reg_model_version_id, use_case_id):
-    reg_model_version = client.get(f"registeredModels/{reg_model_id}/versions/{reg_model_version_id}").json()
+    reg_model_version = (prefetched("registeredModelVersion", reg_model_version_id, scope = reg_model_id) 
+                         or cached_get(client, "registeredModelVersion", f"registeredModels/{reg_model_id}/versions/{reg_model_version_id}", reg_model_id, reg_model_version_id))
     url = os.path.join(URL, "registry", "registered-models", reg_model_id, "version", reg_model_version_id, "info")
     try:
         custom_model_id = reg_model_version["sourceMeta"]["customModelDetails"]["id"]
-        custom_model_versions = client.get(f"customModels/{custom_model_id}/versions").json()
-        custom_model_version = [cm for cm in custom_model_versions["data"] if cm['label'] == reg_model_version["sourceMeta"]["customModelDetails"]["versionLabel"]].pop()
+        custom_model_version = _get_custom_model_version_by_label(client, custom_model_id, reg_model_version["sourceMeta"]["customModelDetails"]["versionLabel"])
         custom_model_node = get_custom_model_version_node(client, custom_model_id, custom_model_version["id"])
         node = dict(assetId = reg_model_id, assetVersionId = reg_model_version_id, url = url, label = "customRegisteredModels", name =  reg_model_version["name"], 
             parents = [
                 custom_model_node
             ] )
         return node
+    except CrawlAborted:
+        raise
     except Exception as e:
+        ## not built from a custom model, resolve the project model it was registered from
+        logger.debug("registered model %s version %s has no custom model (%s)", reg_model_id, reg_model_version_id, e)
         project_id = reg_model_version['sourceMeta']['projectId']
-        ## need to fix this so it returns an actual model node in the parents
-        dr_model = dr.Model.get(project_id, reg_model_version["modelId"])
-        project_node = get_project_node(client, project_id, use_case_id)
-        model_node = get_model_node(client, dr_model, project_node)
+        model_node = _get_model_source_node(client, project_id, reg_model_version["modelId"], use_case_id)
         node = dict(assetId = reg_model_id, assetVersionId = reg_model_version_id, url = url, label = "registeredModels", name =  reg_model_version["name"], 
             parents = [model_node])
         return node
 
+@node_resolver("models")
+def _get_model_source_node(client, project_id, model_id, use_case_id):
+    ## the project model a registered model version was built from
+    dr_model = _get_model(project_id, model_id)
+    project_node = get_project_node(client, project_id, use_case_id)
+    return get_model_node(client, dr_model, project_node)
+
+@node_resolver("deployments")
+@memoized("deployments", "dep_id")
 def get_deployment_node(client, dep_id, use_case_id):
     try:
-        dep = dr.Deployment.get(dep_id)
+        ## same request dr.Deployment.get makes, fetched as json so it can be cached
+        dep = dr.Deployment.from_server_data(prefetched("deployment", dep_id) or cached_get(client, "deployment", f"deployments/{dep_id}/", dep_id))
         cm = dep.model.get("custom_model_image")
         mp = dep.model_package
         reg_model_id = mp["registered_model_id"]
         reg_model_name = mp["name"]
         try:
-            reg_model_versions = client.get(f"registeredModels/{reg_model_id}/versions").json()["data"]
-            reg_model_version = [v for v in reg_model_versions if v["name"] == reg_model_name].pop()
+            reg_model_version = _get_registered_model_version_by_name(client, reg_model_id, reg_model_name)
             reg_model_node = get_registered_model_node(client, reg_model_id, reg_model_version["id"], use_case_id)
         except Exception as e:
-            print(e)
-            print("cant retrieve reg model versions")
-            reg_model_node = {"assetId": reg_model_id, "note": e}
+            _failed("get_deployment_node", f"{dep_id} registered model {reg_model_id}", e)
+            reg_model_node = {"assetId": reg_model_id, "note": str(e)}
         deployment_node = dict(assetId = dep.id, name = dep.label, label = "deployments", url = os.path.join(URL, "console-nextgen", "deployments", dep.id, "overview"),
                                 parents = [
                                     reg_model_node
@@ -230,14 +392,16 @@ def get_deployment_node(client, dep_id, use_case_id):
             )
         return deployment_node
     except Exception as e:
-        print(e)
+        _failed("get_deployment_node", dep_id, e)
         return None
     
+@node_resolver("llm")
 def get_llm_node(client, llm_id):
     llm_node = llm = dict(assetId = llm_id, label = "llm")
     return llm_node
 
 
+@node_resolver("llmBlueprint")
 def get_llm_blueprint_nodes(client, playground_id, use_case_id):
     llm_blueprints = client.get("genai/llmBlueprints/", params = {"playgroundId": playground_id}).json()["data"]
     temp = []
@@ -253,158 +417,501 @@ def get_llm_blueprint_nodes(client, playground_id, use_case_id):
         temp.append(node)
     return temp
 
-import pprint 
+def _failed(resolver, asset_id, error):
+    ## resolvers degrade to placeholder nodes (or None) instead of failing the build, keep a trace of it.
+    ## rate limits and deadlines fail the build instead, a placeholder would hide lineage that exists
+    logger.warning("%s %s failed: %s", resolver, asset_id, error)
+    record_error(resolver, error)
+    if isinstance(error, CrawlAborted):
+        raise error
+
 def define_id(node, parents):
-    node_id = node["assetId"]
-    parents = [p for p in parents if p]
-    parents = [parent for parent in parents if parent.get("assetId")]
-    if version := node.get("assetVersionId"):
-        node["id"] = node_id + "-" + version
-    else:
-        node["id"] = node_id 
-    node["assetId"] = node_id
-    if parents:
+    ## sets "id" on node and every ancestor with an assetId. ancestors shared between
+    ## subtrees are the same dict (see crawl_cache.memoized) so each is only walked once.
+    seen = set()
+    stack = [(node, parents)]
+    while stack:
+        node, parents = stack.pop()
+        node["id"] = node_id(node)
         for parent in parents:
-            define_id(parent, parent.get("parents", []))
+            if parent and parent.get("assetId") and id(parent) not in seen:
+                seen.add(id(parent))
+                stack.append((parent, parent.get("parents", [])))
+
+def _submit(executor, fn, *args, **kwargs):
+    ## the datarobot client is bound to the calling context (see use_client), so run every
+    ## task in a copy of it. otherwise worker threads fall back to whatever client was set last.
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+def _gather(futures):
+    return [f.result() for f in futures]
+
+def _get_listing(client, use_case_id, listing):
+    with resolving("_get_listing", "useCase"):
+        return client.get(f"useCases/{use_case_id}/{listing}").json()
+
+
+def _get_registered_model_version_nodes(client, reg_model, use_case_id):
+    return [get_registered_model_node(client, reg_model["id"], v["id"], use_case_id) for v in reg_model["versions"]]
+
+def _get_recipe_root_node(client, recipe_id, use_case_id):
+    return get_recipe_node(client, _get_recipe(client, recipe_id)["recipeId"], use_case_id)
+
+def _get_playground_node(client, playground_id, use_case_id):
+    return dict( assetId = playground_id, label = "playgrounds", url = os.path.join(URL,"usecases", use_case_id, "playgrounds", playground_id, "comparison" ), parents = [])
+
+def get_root_specs(use_case_id, listings, options = None):
+    ## top level assets of a use case, in the order their nodes appear in the graph, as
+    ## (key, listing entry, resolver, resolver args). resolvers return a node or a list of nodes.
+    get_models = get_model_summary_node if options is not None and options.model_summary else get_model_nodes
+    data, datasets, deployments = listings["data"], listings["datasets"], listings["deployments"]
+    playgrounds, projects, registeredModels, vector_databases = listings["playgrounds"], listings["projects"], listings["registeredModels"], listings["vectorDatabases"]
+    specs = []
+    specs.extend((f"datasets/{d['datasetId']}/{d['versionId']}", d, get_dataset_node, (d["datasetId"], d["versionId"], use_case_id)) for d in datasets["data"])
+    specs.extend((f"recipes/{d['entityId']}", d, _get_recipe_root_node, (d["entityId"], use_case_id)) for d in data["data"] if d["entityType"] == "RECIPE")
+    specs.extend((f"vectorDatabases/{d['id']}", d, get_vectordatabase_node, (d["id"], use_case_id)) for d in vector_databases["data"])
+    specs.extend((f"projects/{d['projectId']}", d, get_project_node, (d["projectId"], use_case_id)) for d in projects["data"])
+    specs.extend((f"models/{d['projectId']}", d, get_models, (d["projectId"], use_case_id)) for d in projects["data"])
+    specs.extend((f"registeredModels/{m['id']}", m, _get_registered_model_version_nodes, (m, use_case_id)) for m in registeredModels["data"])
+    specs.extend((f"deployments/{d['id']}", d, get_deployment_node, (d["id"], use_case_id)) for d in deployments["data"])
+    specs.extend((f"llmBlueprints/{d['id']}", d, get_llm_blueprint_nodes, (d["id"], use_case_id)) for d in playgrounds["data"])
+    specs.extend((f"playgrounds/{d['id']}", d, _get_playground_node, (d["id"], use_case_id)) for d in playgrounds["data"])
+    return specs
+
+def _wanted_specs(specs, options):
+    ## top level assets the label filters of options leave in
+    if options is None:
+        return specs
+    return [spec for spec in specs if options.wants_any(ROOT_LABELS[spec[0].split("/", 1)[0]])]
+
+def attach_build_hooks(client):
+    ## the hooks report to the progress and profile of whichever build's context makes the request,
+    ## so pooled clients shared by concurrent builds keep them apart. added once per client
+    hooks = getattr(client, "hooks", None)
+    if hooks is None:
+        return
+    with _hooks_lock:
+        for hook in (record_api_call, record_call):
+            if hook not in hooks["response"]:
+                hooks["response"].append(hook)
+
+def _options_dict(options):
+    return options.to_dict() if options is not None else {}
+
+def _resolve_root(key, resolver, client, args):
+    with resolving_root(key):
+        nodes = resolver(client, *args)
+    if not isinstance(nodes, list):
+        nodes = [nodes]
+    ## label filters of the build can leave a top level asset without nodes
+    return [n for n in nodes if n is not SKIPPED]
+
+def listing_signature(entry):
+    ## listing entries carry the asset id, version id and modification timestamps where the
+    ## API has them, so any change to the entry means the asset has to be resolved again
+    return hashlib.sha1(json.dumps(entry, sort_keys = True, default = str).encode()).hexdigest()
+
+def node_id(node):
+    ## a model summary shares the asset id of its project
+    if node.get("label") == "modelSummary":
+        return node["assetId"] + "-models"
+    if version := node.get("assetVersionId"):
+        return node["assetId"] + "-" + version
+    return node["assetId"]
+
+def _root_ok(nodes):
+    ## failed lookups come back as None or as placeholders carrying a note, retry those on refresh
+    return all(n is not None and n.get("assetId") and "note" not in n for n in nodes)
+
+def _restore_node(table, nid, restored, copy = None):
+    ## rebuild the nested ancestry of a node from a stored (flattened) nodes file. copy is the
+    ## parent copy a child stored of it, kept verbatim: it can differ from the node's own entry,
+    ## e.g. a model fetched with Model.get under a registered model vs its leaderboard record
+    key = (nid, json.dumps(copy, sort_keys = True, default = str) if copy is not None else None)
+    if key in restored:
+        return restored[key]
+    stored = table[nid]
+    if copy is None:
+        node = {k: v for k, v in stored.items() if k not in ("parents", "color")}
     else:
-        pass
-
-def build_graph(client, use_case_id):
-    applications = client.get(f"useCases/{use_case_id}/applications").json()
-    customApplications = client.get(f"useCases/{use_case_id}/customApplications").json()
-    data = client.get(f"useCases/{use_case_id}/data").json()
-    datasets = client.get(f"useCases/{use_case_id}/datasets").json()
-    deployments = client.get(f"useCases/{use_case_id}/deployments").json()
-    notebooks = client.get(f"useCases/{use_case_id}/notebooks").json()
-    playgrounds = client.get(f"useCases/{use_case_id}/playgrounds").json()
-    projects = client.get(f"useCases/{use_case_id}/projects").json()
-    registeredModels = client.get(f"useCases/{use_case_id}/registeredModels").json()
-    vector_databases = client.get(f"useCases/{use_case_id}/vectorDatabases").json()
-    # shared_roles = client.get(f"useCases/{use_case_id}/sharedRoles").json(
-    recipes = {'data': []}
-    for d in data["data"]:
-        if d["entityType"] == "RECIPE":
-            resp = client.get(f"recipes/{d['entityId']}").json()
-            recipes["data"].append(resp)
-
-    dataset_nodes = [ get_dataset_node(client, d["datasetId"], d["versionId"], use_case_id) for d in datasets["data"]]
-    recipe_nodes = [ get_recipe_node(client, r["recipeId"], use_case_id) for r in recipes["data"] ]
-    deployment_nodes = [get_deployment_node(client, d["id"], use_case_id) for d in deployments["data"]]
-    vdb_nodes = [ get_vectordatabase_node(client, d["id"], use_case_id) for d in vector_databases["data"]]
-    project_nodes = [ get_project_node(client, d["projectId"], use_case_id) for d in projects["data"] ] 
-    model_nodes = [ get_model_nodes(client, d["projectId"], use_case_id) for d in projects["data"]]
-    registered_model_nodes =[]
-    for m in registeredModels["data"]:
-        for v in m["versions"]:
-            registered_model_nodes.append( get_registered_model_node(client,  m["id"], v["id"], use_case_id))
-    llm_bp_llm_nodes = [ get_llm_blueprint_nodes(client, d["id"], use_case_id) for d in playgrounds["data"]]
-    playground_nodes = [dict( assetId = p["id"], label = "playgrounds", url = os.path.join(URL,"usecases", use_case_id, "playgrounds", p["id"], "comparison" ), parents = []) for p in playgrounds["data"]]
-    model_nodes = list(itertools.chain(*model_nodes))
-    llm_bp_llm_nodes = list(itertools.chain(*llm_bp_llm_nodes))
-
-    print("ahhhhhh"*20)
-    print(client.token)
-    print(client.endpoint)
-    
-    nodes = []
-    nodes.extend(dataset_nodes)
-    nodes.extend(recipe_nodes)
-    nodes.extend(vdb_nodes)
-    nodes.extend(project_nodes)
-    nodes.extend(model_nodes)
-    nodes.extend(registered_model_nodes)
-    nodes.extend(deployment_nodes)
-    nodes.extend(llm_bp_llm_nodes)
-    nodes.extend(playground_nodes)
-
-    nodes = [n for n in nodes if n]
+        node = dict(copy, **{k: stored[k] for k in ("expandable", "expand") if k in stored})
+    restored[key] = node
+    if "parents" in stored:
+        node["parents"] = [_restore_node(table, p["id"], restored, p) if p and p.get("id") in table else p for p in stored["parents"]]
+    return node
 
-    for i, node in enumerate(nodes):
-        define_id(node, node.get("parents", []))
-        nodes[i] = node
+def _reusable_roots(previous_nodes, previous_manifest):
+    if not previous_nodes or not previous_manifest:
+        return {}
+    table = {}
+    for n in previous_nodes:
+        table.setdefault(n["id"], n)
+    restored = {}
+    reusable = {}
+    for root in previous_manifest["roots"]:
+        if root["ok"] and all(nid in table for nid in root["ids"]):
+            ## top level nodes get decorated in place, hand out copies of the shared restored nodes
+            reusable[root["key"]] = (root["signature"], [dict(_restore_node(table, nid, restored)) for nid in root["ids"]])
+    return reusable
+
+def prefetch_collections(client, listings, executor):
+    ## pull collections the resolvers would otherwise GET one item at a time and index them.
+    ## anything missing from the index (or a listing that fails) falls back to single GETs.
+    index = current_prefetch.get()
+    jobs = [("datastore", "externalDataStores/"), ("datasource", "externalDataSources/")]
+    if len(listings["deployments"]["data"]) >= PREFETCH_DEPLOYMENTS_MIN:
+        jobs.append(("deployment", "deployments/"))
+    futures = [_submit(executor, _prefetch_list, client, collection, path) for collection, path in jobs]
+    ## version lists are indexed by _get_registered_model_versions itself
+    futures.extend(_submit(executor, _get_registered_model_versions, client, m["id"]) for m in listings["registeredModels"]["data"])
+    for i, future in enumerate(futures):
+        try:
+            items = future.result()
+        except BuildDeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning("prefetch failed, falling back to single lookups: %s", e)
+            continue
+        if i < len(jobs):
+            index.add(jobs[i][0], items)
+
+def _prefetch_list(client, collection, path):
+    with resolving("prefetch_collections", collection):
+        return list_all(client, path)
+
+def crawl_graph(client, use_case_id, max_workers = DEFAULT_MAX_WORKERS, cache = None, asset_cache = None, previous_nodes = None, previous_manifest = None, prefetch = True, progress = None, stream_to = None, profile = None, deadline_seconds = None, options = None):
+    """Crawl a use case and return (nodes, edges, manifest).
+
+    The manifest records a signature of the listing entry behind every top level asset and
+    the ids of the nodes it produced. Passing the previously stored nodes and manifest back in
+    turns this into an incremental refresh: unchanged assets are restored from the stored
+    graph, added or changed ones are resolved, and deleted ones drop out.
+
+    With prefetch, collections such as datastores, datasources and registered model versions
+    are listed once up front (see prefetch_collections) instead of fetched item by item.
+
+    progress is an optional BuildProgress updated as top level assets resolve, for callers
+    polling a build running in another thread.
+
+    stream_to is an optional path the graph is written to as NDJSON records while the
+    crawl is still running, one top level asset at a time (see GraphStream).
+
+    profile is an optional BuildProfile recording every DataRobot call the build makes.
+
+    deadline_seconds bounds the crawl: requests (and rate limit or retry waits) that would run
+    past it raise rate_limit.BuildDeadlineExceeded and the build fails. Requests are only
+    retried and rate limited if the client goes through rate_limit.throttle.
+
+    options is an optional BuildOptions limiting the depth and labels resolved, the manifest
+    records them and a refresh only reuses assets of a graph built with the same options.
+    """
+    ## every asset is fetched at most once per build, pass a CrawlCache in to read its stats afterwards.
+    ## asset_cache is an optional AssetCache persisting payloads across builds.
+    cache = CrawlCache() if cache is None else cache
+    cache_token = current_cache.set(cache)
+    asset_cache_token = current_asset_cache.set(asset_cache)
+    prefetch_token = current_prefetch.set(PrefetchIndex() if prefetch else None)
+    progress_token = current_progress.set(progress)
+    profile_token = current_profile.set(profile)
+    ## default options resolve everything, exactly like no options
+    options = None if options is None or options.is_default else options
+    options_token = current_options.set(options)
+    if progress is not None:
+        progress.start()
+    attach_build_hooks(client)
+    ## dr.* calls made by the crawl use the client passed in, not the global one set by dr.Client
+    with use_client(client), deadline(deadline_seconds):
+        executor = ThreadPoolExecutor(max_workers = max_workers)
+        try:
+            listings = get_listings(client, use_case_id, executor)
+            # shared_roles = client.get(f"useCases/{use_case_id}/sharedRoles").json(
+            specs = _wanted_specs(get_root_specs(use_case_id, listings, options), options)
+            ## assets resolved with other options can't stand in for these
+            same_options = previous_manifest is not None and previous_manifest.get("options", {}) == _options_dict(options)
+            reusable = _reusable_roots(previous_nodes, previous_manifest) if same_options else {}
+
+            ## every top level asset is an independent subtree, submit them all up front and
+            ## collect in order so the output matches a sequential crawl
+            signatures = [listing_signature(entry) for _, entry, _, _ in specs]
+            stale = [not (key in reusable and reusable[key][0] == signature) for (key, _, _, _), signature in zip(specs, signatures)]
+            resolved = sum(stale)
+            if progress is not None:
+                progress.add_total(len(specs))
+                progress.advance(len(specs) - resolved)
+            if prefetch and resolved:
+                _set_phase(progress, "prefetch")
+                prefetch_collections(client, listings, executor)
+            _set_phase(progress, "resolving")
+            results = []
+            for (key, _, resolver, args), is_stale in zip(specs, stale):
+                if is_stale:
+                    future = _submit(executor, _resolve_root, key, resolver, client, args)
+                    if progress is not None:
+                        future.add_done_callback(lambda _: progress.advance())
+                    results.append(future)
+                else:
+                    results.append(reusable[key][1])
+            batches = (r if isinstance(r, list) else r.result() for r in results)
+            if stream_to is not None:
+                batches = _stream_batches(batches, stream_to)
+            results = list(batches)
+        finally:
+            ## if one subtree blew up don't keep crawling the rest of the use case
+            executor.shutdown(cancel_futures = True)
+            current_cache.reset(cache_token)
+            current_asset_cache.reset(asset_cache_token)
+            current_prefetch.reset(prefetch_token)
+            current_progress.reset(progress_token)
+            current_profile.reset(profile_token)
+            current_options.reset(options_token)
+    logger.info("use case %s: %d of %d top level assets resolved, crawl cache: %s", use_case_id, resolved, len(specs), cache.stats())
+    if profile is not None:
+        profile.finish(cache.stats())
+
+    manifest = dict(roots = [dict(key = key, signature = signature, ok = _root_ok(nodes), ids = [node_id(n) for n in nodes if n])
+                             for (key, _, _, _), signature, nodes in zip(specs, signatures, results)])
+    if options is not None:
+        manifest["options"] = options.to_dict()
+    _set_phase(progress, "assembling")
+    nodes, edges = assemble_graph(list(itertools.chain(*results)))
+    return (nodes, edges, manifest)
+
+def get_listings(client, use_case_id, executor):
+    return dict(zip(USE_CASE_LISTINGS, _gather([_submit(executor, _get_listing, client, use_case_id, listing) for listing in USE_CASE_LISTINGS])))
+
+def manifest_current(client, use_case_id, manifest, max_workers = DEFAULT_MAX_WORKERS, options = None):
+    """True if a refresh of the graph stored with manifest would not resolve anything.
+
+    That is the graph was built with the same options, every top level asset is still listed,
+    in the same order and with the same signature, and resolved without failures last time.
+    Only the use case listings are fetched.
+    """
+    options = None if options is None or options.is_default else options
+    if manifest.get("options", {}) != _options_dict(options):
+        return False
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        listings = get_listings(client, use_case_id, executor)
+    current = [(key, listing_signature(entry)) for key, entry, _, _ in _wanted_specs(get_root_specs(use_case_id, listings, options), options)]
+    return current == [(root["key"], root["signature"]) for root in manifest["roots"]] and all(root["ok"] for root in manifest["roots"])
+
+def _set_phase(progress, phase):
+    if progress is not None:
+        progress.set_phase(phase)
+
+def build_graph(client, use_case_id, **kwargs):
+    nodes, edges, _ = crawl_graph(client, use_case_id, **kwargs)
+    return (nodes, edges)
 
-    for node in nodes:
-        if node.get("versionId"):
-            pass
+def expand_node(client, node, use_case_id, options = None, asset_cache = None, profile = None):
+    """Resolve the parents of an expandable node of a stored graph, as (nodes, edges).
+
+    node is the stored node with its "expand" entry. Its ancestry is resolved options.max_depth
+    levels deep (one by default), nodes at that depth are expandable in turn. The node itself
+    comes first, resolved, see merge_expansion. Expanding a top level node also returns the
+    other top level nodes its resolver returns, e.g. the models of a model summary.
+    """
+    expand = node.get("expand")
+    if not node.get("expandable") or not expand or expand["resolver"] not in EXPANDERS:
+        raise ValueError(f"node {node.get('id')} is not expandable")
+    options = BuildOptions(max_depth = 1) if options is None else options
+    if options.max_depth is not None and options.max_depth < 1:
+        raise ValueError("expanding a node takes a max depth of at least 1")
+
+    def resolve():
+        ## a fresh context, like a build of its own with the node as the only top level asset
+        current_cache.set(CrawlCache())
+        current_asset_cache.set(asset_cache)
+        current_prefetch.set(None)
+        current_profile.set(profile)
+        current_options.set(None if options.is_default else options)
+        with use_client(client), resolving_root(node["id"]):
+            result = EXPANDERS[expand["resolver"]](client, **expand["args"])
+        result = [n for n in (result if isinstance(result, list) else [result]) if isinstance(n, dict) and n.get("assetId")]
+        for n in result:
+            define_id(n, n.get("parents", []))
+        resolved = [n for n in result if n["id"] == node["id"]][:1]
+        if not resolved:
+            raise LookupError(f"{expand['resolver']} did not resolve node {node['id']} again")
+        return resolved + [n for n in result if n is not resolved[0]] if "color" in node else resolved
+
+    attach_build_hooks(client)
+    resolved = contextvars.copy_context().run(resolve)
+    nodes, edges = assemble_graph(resolved)
+    nodes[0].pop("color", None)
+    return nodes, edges
+
+def merge_expansion(nodes, edges, expanded_nodes, expanded_edges):
+    """Merge the (nodes, edges) of expand_node into a stored graph, in place.
+
+    The expanded node and any other stored expandable node that came back resolved further
+    are replaced (keeping their color), new nodes are appended. Returns the nodes and the
+    edges that were added or replaced.
+    """
+    index = {}
+    for i, n in enumerate(nodes):
+        index.setdefault(n["id"], i)
+    changed = []
+    for n in expanded_nodes:
+        i = index.get(n["id"])
+        if i is None:
+            index[n["id"]] = len(nodes)
+            nodes.append(n)
+            changed.append(n)
+        elif nodes[i].get("expandable") and n.get("expand") != nodes[i].get("expand"):
+            n = dict(n, color = nodes[i]["color"]) if "color" in nodes[i] else n
+            nodes[i] = n
+            changed.append(n)
+    known = {(e["from"], e["to"]) for e in edges}
+    added = []
+    for e in expanded_edges:
+        if (e["from"], e["to"]) not in known:
+            known.add((e["from"], e["to"]))
+            edges.append(e)
+            added.append(e)
+    return changed, added
+
+def _stream_batches(batches, outfile):
+    ## pass the top level nodes of each asset through, appending their records to outfile as they arrive
+    stream = GraphStream()
+    with open(outfile, "w") as f:
+        try:
+            for batch in batches:
+                write_ndjson(stream.add(batch), f)
+                yield batch
+        except Exception as e:
+            write_ndjson([dict(type = "error", message = str(e))], f)
+            raise
+        write_ndjson([dict(type = "end", nodes = len(stream.emitted), edges = stream.edges)], f)
+
+class GraphStream:
+    """Incremental assemble_graph, turning top level nodes into records as soon as they resolve.
+
+    add() yields {"type": "node", "data": node} and {"type": "edge", "data": edge} records for
+    the top level nodes it is given and any ancestors not streamed yet. An ancestor streamed
+    early can show up again later as a top level node, flagged red, so consumers should upsert
+    nodes by id. The order differs from assemble_graph but the graph is the same.
+    """
+
+    def __init__(self):
+        self.emitted = set()
+        ## emitted without their parents, see BuildOptions. sent again if they turn up resolved
+        self.expandable = set()
+        self.top = set()
+        self.walked = set()
+        self.edges = 0
+
+    def add(self, nodes):
+        for node in nodes:
+            if not node:
+                continue
+            define_id(node, node.get("parents", []))
+            node["parents"] = [p for p in node.get("parents", []) if p is not None and p.get("assetId") is not None]
+            node["color"] = "red"
+            if node["id"] not in self.top:
+                self.top.add(node["id"])
+                ## streamed before as an ancestor, its edges went out with it unless it was streamed expandable (without parents)
+                resolved = node["id"] in self.expandable and not node.get("expandable")
+                yield from self._records(node, with_edges = node["id"] not in self.emitted or resolved)
+            stack = [iter(node["parents"])]
+            while stack:
+                parent = next(stack[-1], StopIteration)
+                if parent is StopIteration:
+                    stack.pop()
+                    continue
+                if parent is None or id(parent) in self.walked:
+                    continue
+                self.walked.add(id(parent))
+                if (pid := parent.get("id")) and (pid not in self.emitted or (pid in self.expandable and not parent.get("expandable"))):
+                    yield from self._records(parent)
+                stack.append(iter(parent.get("parents", [])))
+
+    def _records(self, node, with_edges = True):
+        self.emitted.add(node["id"])
+        if node.get("expandable"):
+            self.expandable.add(node["id"])
         else:
-            try:
-                del node["versionId"]
-            except:
-                pass
-    for node in nodes:
-        for parent in node.get("parents", []):
-            if parent:
-                if parent.get("parentVersionId"):
-                    pass
-                else:
-                    try:
-                        del parent["parentVersionId"]
-                    except:
-                        pass
+            self.expandable.discard(node["id"])
+        yield dict(type = "node", data = _flat_node(node))
+        if with_edges:
+            for parent in node.get("parents") or []:
+                if parent is not None and "id" in parent:
+                    self.edges += 1
+                    yield dict(type = "edge", data = {"from": parent["id"], "to": node["id"]})
+
+_PARENT_ONLY = ("parents", "expandable", "expand")
+
+def _flat_node(node):
+    ## copy of node with its parents one level deep, as stored in the nodes file. whether a
+    ## parent is expandable is up to its own entry, which is replaced once it is expanded
+    node = dict(node)
+    if "parents" in node:
+        node["parents"] = [{k: v for k, v in p.items() if k not in _PARENT_ONLY} if isinstance(p, dict) else p for p in node["parents"]]
+    return node
 
+def assemble_graph(nodes):
+    """Flatten top level nodes and their nested ancestry into (nodes, edges).
+
+    Top level nodes come first, in order, flagged with color "red". Every ancestor not already
+    present is appended the first time a depth first walk of the top level nodes reaches it.
+    Nodes are emitted with their parents one level deep, and an edge is added from each
+    parent to its child.
+    """
+    nodes = [n for n in nodes if n]
     for node in nodes:
-        parents = node.get("parents", [])
-        parents = [p for p in parents if p is not None]
-        parents = [p for p in parents if p.get("assetId") is not None]
-        node["parents"] = parents
+        define_id(node, node.get("parents", []))
+    for node in nodes:
+        node["parents"] = [p for p in node.get("parents", []) if p is not None and p.get("assetId") is not None]
+        node["color"] = "red"
 
-    # print( f"length of datasets in node list is { len([d for d in nodes if d['label'] == 'datasets'])}")
-    node_ids = [n["id"] for n in nodes]
-    
+    ## flat node table in output order, indexed by id
+    table = list(nodes)
+    node_ids = {n["id"]: i for i, n in reversed(list(enumerate(nodes)))}
+    walked = set()
     for node in nodes:
-        node['color'] = "red"
-    def add_parents_as_nodes(node, parents):
-        for parent in parents:
-            if parent is not None:
-                if id := parent.get("id"):
-                    if id in node_ids:
-                        # print("parent already in node id list")
-                        # print(parent)
-                        pass
-                    else:
-                        # print("parent NOT already in node id list")
-                        # print(parent)
-                        nodes.append(parent)
-                        node_ids.append(id)
-                add_parents_as_nodes(parent, parent.get("parents", []))
-
-    nodes_copy = copy.deepcopy(nodes)
-
-    for node in nodes_copy:
-        add_parents_as_nodes(node, node.get("parents", []))
+        stack = [iter(node["parents"])]
+        while stack:
+            parent = next(stack[-1], StopIteration)
+            if parent is StopIteration:
+                stack.pop()
+                continue
+            ## the same ancestor dict reached twice has nothing new to add below it
+            if parent is None or id(parent) in walked:
+                continue
+            walked.add(id(parent))
+            if (pid := parent.get("id")) and pid not in node_ids:
+                node_ids[pid] = len(table)
+                table.append(parent)
+            elif pid and table[node_ids[pid]].get("expandable") and not parent.get("expandable"):
+                ## reached at the depth limit first and resolved in full elsewhere (see BuildOptions)
+                replaced = table[node_ids[pid]]
+                table[node_ids[pid]] = dict(parent, color = replaced["color"]) if "color" in replaced else parent
+            stack.append(iter(parent.get("parents", [])))
 
     edges = []
-    for node in nodes:
-        parents = node.get("parents", [])
-        parents = [] if parents is None else parents
-        for parent in parents:
-            try:
-                edges.append( {"from": parent["id"], "to": node["id"]})
-            except Exception as e:
-                pass
-    
-    for node in nodes:
-        if node["assetId"] == "66683da40019e72defbc4dce":
-            pprint.pprint(node)
+    for node in table:
+        for parent in node.get("parents") or []:
+            if parent is not None and "id" in parent:
+                edges.append({"from": parent["id"], "to": node["id"]})
 
-    # nodes_deep_copy = []
-    for i, node in enumerate(nodes):
-        nodes[i] = copy.deepcopy(node)
-    for node in nodes:
-        parents = node.get("parents", [])
-        for parent in parents:
-            try:
-                del parent["parents"]
-            except Exception as e:
-                pass
+    nodes = [_flat_node(node) for node in table]
     return (nodes, edges)
 
+
 def write_nodes(use_case_id, nodes, outfile):
     with open(outfile, "w") as f:
-        f.write(json.dumps(nodes))
+        write_json_array(nodes, f)
+    write_compressed_variants(outfile)
 def write_edges(use_case_id, edges, outfile):
     with open(outfile, "w") as f:
-        f.write(json.dumps(edges))
+        write_json_array(edges, f)
+    write_compressed_variants(outfile)
+def write_manifest(use_case_id, manifest, outfile):
+    with open(outfile, "w") as f:
+        f.write(json.dumps(manifest))
+def write_profile(use_case_id, profile, outfile):
+    with open(outfile, "w") as f:
+        f.write(json.dumps(profile, indent = 2))
 
 
 if __name__ == "__main__":
@@ -414,9 +921,22 @@ if __name__ == "__main__":
     node_output_file = args.node_output_file 
     edge_output_file = args.edge_output_file
 
-    nodes, edges = build_graph(use_case_id)
-    print("nodes and edges retrieved")
-    print(nodes)
+    logging.basicConfig(level = logging.INFO, format = "%(asctime)s %(levelname)s %(name)s: %(message)s")
+    client = dr.Client()
+    throttle(client, RateLimiter(args.requests_per_second))
+    recorder = Recorder(client.endpoint).attach(client) if args.record else None
+    cache = CrawlCache()
+    profile = BuildProfile(client.endpoint)
+    options = BuildOptions(args.max_depth, args.include_labels, args.exclude_labels, args.model_summary)
+    nodes, edges = build_graph(client, use_case_id, max_workers = args.max_workers, cache = cache, profile = profile,
+                               deadline_seconds = args.deadline_seconds, options = options)
+    if recorder is not None:
+        recorder.save(args.record, use_case_id = use_case_id)
+        print(f"{len(recorder.responses)} responses recorded to {args.record}")
+    summary = profile.summary()
+    print(f"{len(nodes)} nodes and {len(edges)} edges retrieved with {summary['api_calls']} DataRobot calls in {summary['wall_seconds']}s")
+    if args.profile_output_file:
+        write_profile(use_case_id, summary, os.path.join(script_path, args.profile_output_file))
 
     write_edges(use_case_id, edges, os.path.join(script_path,edge_output_file))
     write_nodes(use_case_id, nodes, os.path.join(script_path,node_output_file))
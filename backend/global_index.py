@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from graph_store import current_version, graph_file, stored_use_cases
+
+## recursive lookups stop here even without a depth limit, lineage graphs are nowhere near this deep
+MAX_DEPTH = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    asset_id TEXT,
+    asset_version_id TEXT,
+    label TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nodes_asset_id ON nodes (asset_id);
+CREATE INDEX IF NOT EXISTS nodes_asset_version_id ON nodes (asset_version_id);
+CREATE INDEX IF NOT EXISTS nodes_label ON nodes (label);
+CREATE TABLE IF NOT EXISTS node_use_cases (
+    node_id TEXT NOT NULL,
+    use_case_id TEXT NOT NULL,
+    PRIMARY KEY (node_id, use_case_id)
+);
+CREATE INDEX IF NOT EXISTS node_use_cases_use_case_id ON node_use_cases (use_case_id);
+CREATE TABLE IF NOT EXISTS edges (
+    from_id TEXT NOT NULL,
+    to_id TEXT NOT NULL,
+    use_case_id TEXT NOT NULL,
+    PRIMARY KEY (from_id, to_id, use_case_id)
+);
+CREATE INDEX IF NOT EXISTS edges_to_id ON edges (to_id);
+CREATE INDEX IF NOT EXISTS edges_use_case_id ON edges (use_case_id);
+CREATE TABLE IF NOT EXISTS use_cases (
+    use_case_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    nodes INTEGER NOT NULL,
+    edges INTEGER NOT NULL
+);
+"""
+
+_WALK = {
+    ## (column we follow, column we join on)
+    "ancestors": ("from_id", "to_id"),
+    "descendants": ("to_id", "from_id"),
+}
+
+
+class GlobalLineageIndex:
+    """Every stored use case graph merged into one deduplicated node/edge store in SQLite.
+
+    Nodes are keyed by the id define_id assigns, so a datastore or dataset version used by
+    several use cases is a single node and lineage queries cross use case boundaries. Each
+    node and edge remembers which use cases it came from, so rebuilding one use case only
+    replaces that use case's share of the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread = False, timeout = 30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def update_use_case(self, use_case_id, nodes, edges, updated_at = None):
+        """Replace the nodes and edges of one use case, in a single transaction."""
+        rows = {}
+        for node in nodes:
+            ## top level nodes come first in the nodes file, keep those over later duplicates
+            rows.setdefault(node["id"], node)
+        edge_rows = {(e["from"], e["to"]) for e in edges}
+        with self._lock, self._conn:
+            previous = [r[0] for r in self._conn.execute("SELECT node_id FROM node_use_cases WHERE use_case_id = ?", (use_case_id,))]
+            self._conn.execute("DELETE FROM node_use_cases WHERE use_case_id = ?", (use_case_id,))
+            self._conn.execute("DELETE FROM edges WHERE use_case_id = ?", (use_case_id,))
+            self._conn.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?)",
+                                   [(nid, n.get("assetId"), n.get("assetVersionId"), n.get("label"), json.dumps(_strip(n))) for nid, n in rows.items()])
+            self._conn.executemany("INSERT INTO node_use_cases VALUES (?, ?)", [(nid, use_case_id) for nid in rows])
+            self._conn.executemany("INSERT INTO edges VALUES (?, ?, ?)", [(f, t, use_case_id) for f, t in edge_rows])
+            self._delete_orphans(previous)
+            self._conn.execute("INSERT OR REPLACE INTO use_cases VALUES (?, ?, ?, ?)",
+                               (use_case_id, updated_at or time.time(), len(rows), len(edge_rows)))
+
+    def remove_use_case(self, use_case_id):
+        with self._lock, self._conn:
+            previous = [r[0] for r in self._conn.execute("SELECT node_id FROM node_use_cases WHERE use_case_id = ?", (use_case_id,))]
+            self._conn.execute("DELETE FROM node_use_cases WHERE use_case_id = ?", (use_case_id,))
+            self._conn.execute("DELETE FROM edges WHERE use_case_id = ?", (use_case_id,))
+            self._conn.execute("DELETE FROM use_cases WHERE use_case_id = ?", (use_case_id,))
+            self._delete_orphans(previous)
+
+    def _delete_orphans(self, node_ids):
+        ## nodes no other use case refers to any more
+        self._conn.executemany(
+            "DELETE FROM nodes WHERE id = ? AND NOT EXISTS (SELECT 1 FROM node_use_cases WHERE node_id = ?)", [(n, n) for n in node_ids])
+
+    def sync_directory(self, directory):
+        """Index every graph stored in directory (see graph_store) newer than its entry in the index."""
+        with self._lock:
+            indexed = dict(self._conn.execute("SELECT use_case_id, updated_at FROM use_cases").fetchall())
+        updated = []
+        for use_case_id in stored_use_cases(directory):
+            version = current_version(directory, use_case_id)
+            node_file, edge_file = graph_file(directory, use_case_id, "nodes", version), graph_file(directory, use_case_id, "edges", version)
+            if version is None or not (os.path.exists(node_file) and os.path.exists(edge_file)):
+                continue
+            mtime = max(os.path.getmtime(node_file), os.path.getmtime(edge_file))
+            if indexed.get(use_case_id, 0) >= mtime:
+                continue
+            with open(node_file, "r") as f:
+                nodes = json.load(f)
+            with open(edge_file, "r") as f:
+                edges = json.load(f)
+            self.update_use_case(use_case_id, nodes, edges, updated_at = mtime)
+            updated.append(use_case_id)
+        return updated
+
+    def find(self, node_id = None, asset_id = None, asset_version_id = None, label = None):
+        """Ids of the nodes matching a node id, or an asset id (and version) and label."""
+        if node_id is not None:
+            query, params = "SELECT id FROM nodes WHERE id = ?", [node_id]
+        else:
+            clauses, params = [], []
+            for column, value in (("asset_id", asset_id), ("asset_version_id", asset_version_id), ("label", label)):
+                if value is not None:
+                    clauses.append(f"{column} = ?")
+                    params.append(value)
+            if not clauses:
+                return []
+            query = "SELECT id FROM nodes WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return [r[0] for r in self._conn.execute(query, params)]
+
+    def lineage(self, node_ids, direction = "ancestors", max_depth = None, labels = None):
+        """Subgraph of node_ids and everything up or downstream of them, across use cases.
+
+        Like LineageIndex, labels only filters which nodes are returned, edges are kept when
+        both of their ends are. Nodes carry their depth and the use cases they appear in.
+        """
+        follow, join = _WALK[direction]
+        depth_limit = MAX_DEPTH if max_depth is None else min(max_depth, MAX_DEPTH)
+        seeds = ",".join("(?, 0)" for _ in node_ids)
+        with self._lock:
+            depths = dict(self._conn.execute(f"""
+                WITH RECURSIVE walk(id, depth) AS (
+                    VALUES {seeds}
+                    UNION
+                    SELECT e.{follow}, walk.depth + 1 FROM edges e JOIN walk ON e.{join} = walk.id WHERE walk.depth < ?
+                )
+                SELECT id, MIN(depth) FROM walk GROUP BY id""", [*node_ids, depth_limit]).fetchall()) if node_ids else {}
+            ids = list(depths)
+            nodes, use_cases, edges = {}, {}, set()
+            for chunk in _chunks(ids):
+                marks = ",".join("?" * len(chunk))
+                for nid, label, data in self._conn.execute(f"SELECT id, label, data FROM nodes WHERE id IN ({marks})", chunk):
+                    if nid in node_ids or labels is None or label in labels:
+                        nodes[nid] = json.loads(data)
+                for nid, use_case_id in self._conn.execute(f"SELECT node_id, use_case_id FROM node_use_cases WHERE node_id IN ({marks})", chunk):
+                    use_cases.setdefault(nid, []).append(use_case_id)
+                edges.update(self._conn.execute(f"SELECT DISTINCT from_id, to_id FROM edges WHERE {join} IN ({marks})", chunk).fetchall())
+        return dict(roots = list(node_ids),
+                    nodes = [dict(n, depth = depths[nid], useCases = sorted(use_cases.get(nid, []))) for nid, n in nodes.items()],
+                    edges = [{"from": f, "to": t} for f, t in sorted(edges) if f in nodes and t in nodes and _within(depths, f, t, direction, depth_limit)])
+
+    def stats(self):
+        with self._lock:
+            return dict(path = self.path,
+                        nodes = self._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0],
+                        edges = self._conn.execute("SELECT COUNT(*) FROM (SELECT DISTINCT from_id, to_id FROM edges)").fetchone()[0],
+                        use_cases = self._conn.execute("SELECT COUNT(*) FROM use_cases").fetchone()[0])
+
+
+def _within(depths, f, t, direction, depth_limit):
+    ## an edge leading out of the deepest level is not part of the walk
+    inner = t if direction == "ancestors" else f
+    return depths[inner] < depth_limit
+
+def _strip(node):
+    ## parents are in the edges table, color only means top level within one use case
+    return {k: v for k, v in node.items() if k not in ("parents", "color")}
+
+def _chunks(items, size = 500):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
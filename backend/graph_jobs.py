@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from progress import BuildProgress
+from build_profile import BuildProfile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_BUILDS = 2
+## finished jobs are kept around this long so clients can still poll their final status
+DEFAULT_JOB_RETENTION_SECONDS = 60 * 60
+
+
+class GraphJob:
+    def __init__(self, use_case_id, options = None):
+        self.id = uuid.uuid4().hex
+        self.use_case_id = use_case_id
+        ## what the job builds, e.g. BuildOptions.to_dict(), for requests deciding whether to join it
+        self.options = options or {}
+        self.status = "queued"
+        self.error = None
+        self.progress = BuildProgress()
+        self.profile = BuildProfile()
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return dict(jobId = self.id, useCaseId = self.use_case_id, options = self.options, status = self.status, error = self.error,
+                    submittedAt = self.submitted_at, finishedAt = self.finished_at, progress = self.progress.snapshot())
+
+
+class GraphJobManager:
+    """Runs graph builds in background threads, at most one per use case at a time.
+
+    Submitting a use case that already has a queued or running build returns that job
+    instead of starting a second crawl, whatever its options: callers check job.options before
+    treating the running build as theirs. Jobs only exist in the process that runs them, with
+    several server processes pass a status_dir they share: every job writes its status there
+    when it is queued, starts and finishes, so status() answers for jobs of other processes too.
+    """
+
+    def __init__(self, max_concurrent_builds = DEFAULT_MAX_CONCURRENT_BUILDS, retention_seconds = DEFAULT_JOB_RETENTION_SECONDS, status_dir = None):
+        self.retention_seconds = retention_seconds
+        self.status_dir = status_dir
+        if status_dir is not None:
+            os.makedirs(status_dir, exist_ok = True)
+        self._executor = ThreadPoolExecutor(max_workers = max_concurrent_builds, thread_name_prefix = "graph-build")
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, use_case_id, build, options = None):
+        """Queue build(job) for use_case_id, or join the build already in flight.
+
+        Returns (job, created). A joined job may have been submitted with other options.
+        """
+        with self._lock:
+            self._expire(time.time())
+            job = self._active.get(use_case_id)
+            if job is not None:
+                return job, False
+            job = GraphJob(use_case_id, options)
+            self._jobs[job.id] = job
+            self._active[use_case_id] = job
+        self._save(job)
+        self._executor.submit(self._run, job, build)
+        return job, True
+
+    def _run(self, job, build):
+        job.status = "running"
+        self._save(job)
+        try:
+            build(job)
+            job.status = "done"
+            job.progress.finish("done")
+        except Exception as e:
+            logger.error("graph build for use case %s failed\n%s", job.use_case_id, traceback.format_exc())
+            job.status = "failed"
+            job.error = str(e)
+            job.progress.finish("failed")
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            with self._lock:
+                if self._active.get(job.use_case_id) is job:
+                    del self._active[job.use_case_id]
+            job.done.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self, use_case_id):
+        with self._lock:
+            return self._active.get(use_case_id)
+
+    def status(self, job_id):
+        """to_dict() of a job of this process, or the last status a job of another one saved, else None."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.status_dir is None or not job_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(self.status_dir, f"{job_id}.json"), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, job):
+        if self.status_dir is None:
+            return
+        path = os.path.join(self.status_dir, f"{job.id}.json")
+        with open(f"{path}.tmp", "w") as f:
+            f.write(json.dumps(job.to_dict()))
+        os.replace(f"{path}.tmp", path)
+
+    def _expire(self, now):
+        expired = [k for k, job in self._jobs.items() if job.finished_at is not None and now - job.finished_at > self.retention_seconds]
+        for k in expired:
+            del self._jobs[k]
+            if self.status_dir is not None and os.path.exists(os.path.join(self.status_dir, f"{k}.json")):
+                os.remove(os.path.join(self.status_dir, f"{k}.json"))
@@ -0,0 +1,247 @@
+"""Files a built use case graph is stored as, shared by app.py and batch_build.py.
+
+Every build is written to a snapshot directory of its own, then published by replacing the
+{use_case_id}_current pointer file, so readers get either the old graph or the new one and
+never the new edges with the old nodes:
+
+    {use_case_id}_current                    version of the snapshot readers get
+    {use_case_id}/{version}/
+        {use_case_id}_nodes.json, _edges.json   the graph the frontend loads
+        {use_case_id}_manifest.json              listing signatures for incremental refreshes
+        {use_case_id}_graph.lgc                  the same graph in the compact format, see compact_graph
+        {use_case_id}_graph.ndjson               node and edge records, see graph_stream
+        {use_case_id}_profile.json               DataRobot calls of the last build, see build_profile
+    {use_case_id}.lock                       held while the use case is built, see build_lock
+
+The last SNAPSHOTS_KEPT snapshots stay around, so a reader that resolved a version just
+before a newer one was published can still read all of it. Graphs stored before snapshots
+existed sit directly in the storage directory (version FLAT) until they are rebuilt.
+"""
+import contextlib
+import glob
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+from compact_graph import write_compact
+from create_graph_from_use_case import write_edges, write_manifest, write_nodes, write_profile
+from graph_stream import write_compressed_variants, write_ndjson
+
+try:
+    import fcntl
+except ImportError:  # Windows, builds are then only serialized within a process (see graph_jobs)
+    fcntl = None
+
+GRAPH_FILES = dict(nodes = "{}_nodes.json", edges = "{}_edges.json", manifest = "{}_manifest.json",
+                   compact = "{}_graph.lgc", stream = "{}_graph.ndjson", profile = "{}_profile.json")
+SNAPSHOTS_KEPT = 3
+## snapshot directories a crashed build left half written are removed after this long
+STALE_SNAPSHOT_SECONDS = 60 * 60
+## the version of graphs stored flat in the storage directory, before snapshots
+FLAT = ""
+_VERSION = re.compile(r"^v\d+$")
+
+
+def current_version(storage, use_case_id):
+    """Version of the published snapshot of use_case_id, FLAT for an old flat graph, else None."""
+    try:
+        with open(_pointer_file(storage, use_case_id), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return FLAT if os.path.exists(_in_storage(storage, GRAPH_FILES["nodes"].format(use_case_id))) else None
+
+
+def graph_file(storage, use_case_id, kind, version = None):
+    """Path of one file of a stored graph, of the published snapshot unless version is given.
+
+    Resolve the version once (current_version) when reading several files of the same graph.
+    Raises ValueError for an invalid version, or a use case id naming a path outside storage.
+    """
+    if version is None:
+        version = current_version(storage, use_case_id)
+    if not version:
+        return _in_storage(storage, GRAPH_FILES[kind].format(use_case_id))
+    if not _VERSION.match(version):
+        raise ValueError(f"invalid graph version {version}")
+    return _in_storage(storage, use_case_id, version, GRAPH_FILES[kind].format(use_case_id))
+
+
+def job_stream_file(storage, use_case_id, job_id):
+    ## NDJSON records of a build while it runs, moved into its snapshot once it succeeds
+    return _in_storage(storage, f"{use_case_id}_{job_id}.ndjson")
+
+
+def stored_use_cases(storage):
+    """Ids of the use cases with a stored graph, snapshot or flat."""
+    pointers = [os.path.basename(p)[:-len("_current")] for p in glob.glob(os.path.join(storage, "*_current"))]
+    flat = [os.path.basename(p)[:-len("_nodes.json")] for p in glob.glob(os.path.join(storage, "*_nodes.json"))]
+    return sorted(set(pointers) | set(flat))
+
+
+def load_previous(storage, use_case_id):
+    """(nodes, manifest) of the stored graph, for crawl_graph's incremental refresh, or (None, None)."""
+    version = current_version(storage, use_case_id)
+    if version is None:
+        return None, None
+    node_file, manifest_file = graph_file(storage, use_case_id, "nodes", version), graph_file(storage, use_case_id, "manifest", version)
+    if not (Path(node_file).exists() and Path(manifest_file).exists()):
+        return None, None
+    with open(node_file, "r") as f:
+        nodes = json.load(f)
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+    return nodes, manifest
+
+
+def load_graph(storage, use_case_id):
+    """(nodes, edges, manifest) of the same stored snapshot, or None."""
+    version = current_version(storage, use_case_id)
+    if version is None:
+        return None
+    loaded = []
+    for kind in ("nodes", "edges", "manifest"):
+        path = graph_file(storage, use_case_id, kind, version)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            loaded.append(json.load(f))
+    return tuple(loaded)
+
+
+def load_manifest(storage, use_case_id):
+    manifest_file = graph_file(storage, use_case_id, "manifest")
+    if not Path(manifest_file).exists():
+        return None
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def store_graph(storage, use_case_id, nodes, edges, manifest, stream_file = None, profile = None, global_index = None):
+    """Write every stored form of a freshly built graph as a new snapshot, publish it and return its version.
+
+    stream_file is the NDJSON file the build streamed to, moved into the snapshot, without one
+    the stream file is written from nodes and edges (e.g. after merge_expansion). profile is a
+    BuildProfile summary, without one the profile of the previous snapshot is kept.
+    global_index is a GlobalLineageIndex to merge the graph into. Callers hold build_lock.
+    """
+    previous = current_version(storage, use_case_id)
+    version = f"v{time.time_ns()}"
+    final = _in_storage(storage, use_case_id, version)
+    tmp = _in_storage(storage, use_case_id, f".{version}.tmp")
+    os.makedirs(tmp)
+
+    def path(kind):
+        return os.path.join(tmp, GRAPH_FILES[kind].format(use_case_id))
+
+    try:
+        write_edges(use_case_id, edges, path("edges"))
+        write_nodes(use_case_id, nodes, path("nodes"))
+        write_manifest(use_case_id, manifest, path("manifest"))
+        write_compact(nodes, edges, path("compact"))
+        write_compressed_variants(path("compact"))
+        if stream_file is None:
+            with open(path("stream"), "w") as f:
+                write_ndjson(_stream_records(nodes, edges), f)
+        else:
+            os.replace(stream_file, path("stream"))
+        write_compressed_variants(path("stream"))
+        if profile is not None:
+            write_profile(use_case_id, profile, path("profile"))
+        elif previous is not None and os.path.exists(graph_file(storage, use_case_id, "profile", previous)):
+            shutil.copy2(graph_file(storage, use_case_id, "profile", previous), path("profile"))
+        os.rename(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors = True)
+        raise
+    _publish(storage, use_case_id, version)
+    if global_index is not None:
+        global_index.update_use_case(use_case_id, nodes, edges)
+    if previous == FLAT:
+        for kind in GRAPH_FILES:
+            for suffix in ("", ".gz", ".br"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(graph_file(storage, use_case_id, kind, FLAT) + suffix)
+    _prune(storage, use_case_id, version)
+    return version
+
+
+def _in_storage(storage, *parts):
+    ## use case ids come from requests and CLI arguments, nothing they name may resolve outside storage
+    path = os.path.join(storage, *parts)
+    root, real = os.path.realpath(storage), os.path.realpath(path)
+    if real == root or os.path.commonpath([root, real]) != root:
+        raise ValueError(f"{os.path.join(*parts)} is outside of the graph storage {storage}")
+    return path
+
+
+def _pointer_file(storage, use_case_id):
+    return _in_storage(storage, f"{use_case_id}_current")
+
+
+def _publish(storage, use_case_id, version):
+    ## rename is atomic, readers open either the old pointer or the new one
+    pointer = _pointer_file(storage, use_case_id)
+    tmp = f"{pointer}.{version}.tmp"
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, pointer)
+
+
+def _prune(storage, use_case_id, current):
+    directory = os.path.join(storage, use_case_id)
+    versions = sorted((v for v in os.listdir(directory) if _VERSION.match(v) and v != current), key = lambda v: int(v[1:]))
+    for version in versions[:max(0, len(versions) - (SNAPSHOTS_KEPT - 1))]:
+        shutil.rmtree(os.path.join(directory, version), ignore_errors = True)
+    for tmp in glob.glob(os.path.join(directory, ".*.tmp")):
+        with contextlib.suppress(FileNotFoundError):
+            if time.time() - os.path.getmtime(tmp) > STALE_SNAPSHOT_SECONDS:
+                shutil.rmtree(tmp, ignore_errors = True)
+
+
+def _stream_records(nodes, edges):
+    ## the records of graph_stream for a graph that was not streamed as it was built
+    for node in nodes:
+        yield dict(type = "node", data = node)
+    for edge in edges:
+        yield dict(type = "edge", data = edge)
+    yield dict(type = "end", nodes = len({n["id"] for n in nodes}), edges = len(edges))
+
+
+class BuildLockTimeout(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def build_lock(storage, use_case_id, owner = None, timeout = None, poll_seconds = 0.2):
+    """Hold the lock on building use_case_id, across the processes sharing storage.
+
+    Every process (app workers, batch_build) takes it before reading the stored graph it
+    refreshes and holds it until the new snapshot is published. owner is a dict written into
+    the lock file for whoever is waiting on it. Raises BuildLockTimeout after timeout seconds.
+    """
+    os.makedirs(storage, exist_ok = True)
+    with open(_in_storage(storage, f"{use_case_id}.lock"), "a+") as f:
+        waited = time.monotonic()
+        while fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if timeout is not None and time.monotonic() - waited > timeout:
+                    f.seek(0)
+                    raise BuildLockTimeout(f"use case {use_case_id} is still being built by {f.read() or 'another process'}")
+                time.sleep(poll_seconds)
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(dict(owner or {}, pid = os.getpid(), lockedAt = time.time())))
+        f.flush()
+        try:
+            yield
+        finally:
+            f.seek(0)
+            f.truncate()
+            f.flush()
+            ## closing the file releases the lock
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import time
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+## a build stream is finished once one of these records has been written
+_LAST_RECORDS = (b'{"type": "end"', b'{"type": "error"')
+
+
+def write_json_array(items, f):
+    ## same bytes as f.write(json.dumps(list(items))) without building the whole string first
+    f.write("[")
+    for i, item in enumerate(items):
+        if i:
+            f.write(", ")
+        f.write(json.dumps(item))
+    f.write("]")
+
+
+def write_ndjson(records, f):
+    for record in records:
+        f.write(json.dumps(record) + "\n")
+    f.flush()
+
+
+def write_compressed_variants(path):
+    """Write path.gz (and path.br when brotli is installed) next to a stored graph file.
+
+    Stored graphs only change when they are rebuilt, so they are compressed once here
+    instead of on every request.
+    """
+    variants = [(".gz", lambda f: gzip.GzipFile(fileobj = f, mode = "wb", compresslevel = 6, mtime = 0))]
+    if brotli is not None:
+        variants.append((".br", _BrotliWriter))
+    for suffix, open_variant in variants:
+        tmp = f"{path}{suffix}.tmp"
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            with open_variant(dst) as out:
+                while chunk := src.read(CHUNK_SIZE):
+                    out.write(chunk)
+        os.replace(tmp, path + suffix)
+
+
+class _BrotliWriter:
+    def __init__(self, f):
+        self._f = f
+        self._compressor = brotli.Compressor(quality = 9)
+
+    def write(self, data):
+        self._f.write(self._compressor.process(data))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.write(self._compressor.finish())
+
+
+def compressed_variant(path, accept_encodings):
+    """(path, encoding) of the smallest up to date precompressed variant the client accepts.
+
+    accept_encodings is the parsed Accept-Encoding header (flask's request.accept_encodings).
+    """
+    mtime = os.path.getmtime(path)
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        variant = path + suffix
+        if accept_encodings[encoding] and os.path.exists(variant) and os.path.getmtime(variant) >= mtime:
+            return variant, encoding
+    return path, None
+
+
+def iter_file(path, chunk_size = CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def tail_ndjson(path, done, poll_seconds = 0.1):
+    """Yield complete lines of an NDJSON file while another thread is still appending to it.
+
+    Stops after an end or error record, or once done() is true and the file is exhausted.
+    """
+    with open(path, "rb") as f:
+        pending = b""
+        while True:
+            finished = done()
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                if finished:
+                    return
+                time.sleep(poll_seconds)
+                continue
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                yield line + b"\n"
+                if line.startswith(_LAST_RECORDS):
+                    return
+
+
+def follow_build(job, job_path, final_path, poll_seconds = 0.1):
+    """Stream the records of a background build as they are written.
+
+    The build writes to job_path and moves it to final_path once it succeeds, so a build
+    that is already over is served from final_path. final_path can be a function returning
+    it, for builds that only know where their records end up once they are stored.
+    """
+    while not os.path.exists(job_path):
+        if job.done.is_set():
+            break
+        time.sleep(poll_seconds)
+    else:
+        try:
+            yield from tail_ndjson(job_path, job.done.is_set, poll_seconds)
+            return
+        except FileNotFoundError:
+            ## finished and moved between the exists check and the open
+            pass
+    if callable(final_path):
+        final_path = final_path()
+    if job.status == "done" and os.path.exists(final_path):
+        yield from iter_file(final_path)
+    else:
+        yield (json.dumps(dict(type = "error", message = job.error or "graph build failed")) + "\n").encode()
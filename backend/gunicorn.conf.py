@@ -0,0 +1,30 @@
+"""gunicorn settings for serving app.py in production, from the backend directory:
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py app:app
+
+Several worker processes share ./storage. Graphs are published as atomic snapshots and builds
+of a use case take a cross-process lock (see graph_store), job statuses are shared through
+storage/jobs (see graph_jobs), so any worker can answer for a build another one runs. Each
+worker runs up to GRAPH_MAX_CONCURRENT_BUILDS builds of its own.
+
+Workers are threaded: builds run in background threads of the worker that accepted them, and
+/getUseCaseGraphStream and wait=true requests hold a thread for as long as the build runs.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GRAPH_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("GRAPH_WEB_WORKERS", min(4, multiprocessing.cpu_count() * 2)))
+worker_class = "gthread"
+threads = int(os.environ.get("GRAPH_WEB_THREADS", 16))
+## streams and wait=true requests last as long as a build, don't kill workers serving them
+timeout = int(os.environ.get("GRAPH_WEB_TIMEOUT_SECONDS", 900))
+graceful_timeout = 60
+keepalive = 5
+## every worker opens its own sqlite connections, client pool and build threads at import
+preload_app = False
+chdir = os.path.dirname(os.path.abspath(__file__))
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GRAPH_LOG_LEVEL", "info")
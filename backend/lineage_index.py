@@ -0,0 +1,86 @@
+import collections
+import json
+import os
+import threading
+
+DEFAULT_MAX_GRAPHS = 16
+
+
+class LineageIndex:
+    """Forward and reverse adjacency of a stored use case graph, keyed by node id (see define_id)."""
+
+    def __init__(self, nodes, edges):
+        self.nodes = {}
+        for node in nodes:
+            ## top level nodes come first in the nodes file, keep those over later duplicates
+            self.nodes.setdefault(node["id"], node)
+        self.parents = collections.defaultdict(list)
+        self.children = collections.defaultdict(list)
+        seen = set()
+        for edge in edges:
+            key = (edge["from"], edge["to"])
+            if key in seen:
+                continue
+            seen.add(key)
+            self.parents[edge["to"]].append(edge["from"])
+            self.children[edge["from"]].append(edge["to"])
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def ancestors(self, node_id, max_depth = None, labels = None):
+        """Subgraph of node_id and everything upstream of it, see _walk."""
+        return self._walk(node_id, self.parents, max_depth, labels, upstream = True)
+
+    def descendants(self, node_id, max_depth = None, labels = None):
+        """Subgraph of node_id and everything downstream of it, see _walk."""
+        return self._walk(node_id, self.children, max_depth, labels, upstream = False)
+
+    def _walk(self, node_id, adjacency, max_depth, labels, upstream):
+        ## breadth first up to max_depth hops. the walk goes through every node, labels only
+        ## filters which ones are returned; edges are kept when both of their ends are.
+        depths = {node_id: 0}
+        queue = collections.deque([node_id])
+        edges = []
+        while queue:
+            current = queue.popleft()
+            depth = depths[current]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbour in adjacency.get(current, ()):
+                edges.append({"from": neighbour, "to": current} if upstream else {"from": current, "to": neighbour})
+                if neighbour not in depths:
+                    depths[neighbour] = depth + 1
+                    queue.append(neighbour)
+        keep = {n for n in depths if n == node_id or labels is None or self.nodes.get(n, {}).get("label") in labels}
+        nodes = [dict(self.nodes[n], depth = depths[n]) for n in depths if n in keep and n in self.nodes]
+        edges = [e for e in edges if e["from"] in keep and e["to"] in keep]
+        return dict(root = node_id, nodes = nodes, edges = edges)
+
+
+class LineageIndexCache:
+    """LineageIndex per stored graph, rebuilt when its files change, at most max_graphs kept."""
+
+    def __init__(self, max_graphs = DEFAULT_MAX_GRAPHS):
+        self.max_graphs = max_graphs
+        self._indexes = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, node_file, edge_file):
+        version = (os.stat(node_file).st_mtime_ns, os.stat(edge_file).st_mtime_ns)
+        with self._lock:
+            cached = self._indexes.get(node_file)
+            if cached is not None and cached[0] == version:
+                self._indexes.move_to_end(node_file)
+                return cached[1]
+        with open(node_file, "r") as f:
+            nodes = json.load(f)
+        with open(edge_file, "r") as f:
+            edges = json.load(f)
+        index = LineageIndex(nodes, edges)
+        with self._lock:
+            self._indexes[node_file] = (version, index)
+            self._indexes.move_to_end(node_file)
+            while len(self._indexes) > self.max_graphs:
+                self._indexes.popitem(last = False)
+        return index
@@ -0,0 +1,56 @@
+import contextvars
+import threading
+from build_profile import record_cache
+
+## index of collections prefetched for the graph build running in this context, see crawl_graph
+current_prefetch = contextvars.ContextVar("lineage_prefetch", default = None)
+
+
+def list_all(client, path, params = None):
+    """Every item of a list endpoint, following "next" links when it is paginated."""
+    resp = client.get(path, params = params).json()
+    items = list(resp["data"])
+    while resp.get("next"):
+        resp = client.get(resp["next"]).json()
+        items.extend(resp["data"])
+    return items
+
+
+class PrefetchIndex:
+    """In-memory index of list endpoint payloads, by id and optionally by a name field.
+
+    Collections can be scoped to a parent asset, e.g. registered model versions are indexed
+    per registered model so version names only need to be unique within their model.
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_name = {}
+        self._lock = threading.Lock()
+        self.loaded = {}
+
+    def add(self, collection, items, scope = None, name_key = None):
+        with self._lock:
+            for item in items:
+                self._by_id[(collection, scope, item["id"])] = item
+                if name_key is not None:
+                    self._by_name[(collection, scope, item.get(name_key))] = item
+            self.loaded[(collection, scope)] = len(items)
+
+    def get(self, collection, asset_id, scope = None):
+        return self._by_id.get((collection, scope, asset_id))
+
+    def find(self, collection, name, scope = None):
+        return self._by_name.get((collection, scope, name))
+
+    def has(self, collection, scope = None):
+        return (collection, scope) in self.loaded
+
+
+def prefetched(collection, asset_id, scope = None):
+    index = current_prefetch.get()
+    if index is None or not index.has(collection, scope):
+        return None
+    item = index.get(collection, asset_id, scope)
+    record_cache("prefetch", collection, item is not None)
+    return item
@@ -0,0 +1,59 @@
+import contextvars
+import threading
+import time
+
+## progress of the graph build running in this context, see crawl_graph
+current_progress = contextvars.ContextVar("lineage_build_progress", default = None)
+
+
+class BuildProgress:
+    """Counters a graph build updates as it goes, safe to read from another thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase = "queued"
+        self.total = 0
+        self.resolved = 0
+        self.api_calls = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.phase = "listing"
+
+    def set_phase(self, phase):
+        with self._lock:
+            self.phase = phase
+
+    def add_total(self, n):
+        with self._lock:
+            self.total += n
+
+    def advance(self, n = 1):
+        with self._lock:
+            self.resolved += n
+
+    def add_api_call(self):
+        with self._lock:
+            self.api_calls += 1
+
+    def finish(self, phase = "done"):
+        with self._lock:
+            self.phase = phase
+            self.finished_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            return dict(phase = self.phase, total = self.total, resolved = self.resolved, api_calls = self.api_calls,
+                        elapsed = round(end - self.started_at, 3) if self.started_at else 0.0)
+
+
+def record_api_call(response, *args, **kwargs):
+    """requests response hook counting calls against the build running in this context."""
+    progress = current_progress.get()
+    if progress is not None:
+        progress.add_api_call()
+    return response
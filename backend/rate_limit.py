@@ -0,0 +1,212 @@
+import contextlib
+import contextvars
+import email.utils
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+logger = logging.getLogger(__name__)
+
+## requests per second a client starts out at, and never goes above
+DEFAULT_REQUESTS_PER_SECOND = 20.0
+DEFAULT_MAX_REQUESTS_PER_SECOND = 50.0
+MIN_REQUESTS_PER_SECOND = 0.5
+## requests/second added back per successful response, halved on every 429 (AIMD)
+RATE_INCREASE = 0.05
+RATE_DECREASE = 0.5
+DEFAULT_MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+TRANSIENT_STATUSES = frozenset([429, 502, 503, 504])
+## only requests that can safely be sent twice are retried, the crawl only GETs
+RETRY_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+
+## monotonic time the graph build running in this context has to finish by, see deadline
+current_deadline = contextvars.ContextVar("lineage_build_deadline", default = None)
+
+
+class CrawlAborted(Exception):
+    """The API could not be reached in a way that makes the rest of the build pointless.
+
+    Resolvers let these through instead of turning them into placeholder nodes, so the build
+    fails and the stored graph is left as it was.
+    """
+
+
+class BuildDeadlineExceeded(CrawlAborted):
+    pass
+
+
+class RetriesExhausted(CrawlAborted):
+    def __init__(self, message, response = None):
+        super().__init__(message)
+        self.response = response
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Fail DataRobot requests made in this context (and tasks submitted from it) after seconds."""
+    token = current_deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def _check_deadline(wait = 0.0):
+    ## raises if the build in this context would run past its deadline after waiting wait seconds
+    end = current_deadline.get()
+    if end is not None and time.monotonic() + wait > end:
+        raise BuildDeadlineExceeded("graph build deadline exceeded")
+
+
+def retry_after_seconds(response):
+    """Seconds the Retry-After header of response asks for, seconds or an HTTP date, else None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket shared by every request of a client, adapting its rate to the API.
+
+    Each 429 halves the rate and pauses every worker until the Retry-After the API asked for,
+    each successful response adds RATE_INCREASE back, up to max_rate.
+    """
+
+    def __init__(self, rate = DEFAULT_REQUESTS_PER_SECOND, max_rate = DEFAULT_MAX_REQUESTS_PER_SECOND, burst = None):
+        self.max_rate = max(rate, max_rate)
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.throttled_count = 0
+        self.retry_count = 0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(wait, (1 - self.tokens) / self.rate)
+            _check_deadline(wait)
+            time.sleep(wait)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def throttled(self, retry_after = None):
+        with self._lock:
+            self.throttled_count += 1
+            self.rate = max(MIN_REQUESTS_PER_SECOND, self.rate * RATE_DECREASE)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def retried(self):
+        with self._lock:
+            self.retry_count += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(rate = round(self.rate, 2), max_rate = self.max_rate, throttled = self.throttled_count, retries = self.retry_count)
+
+
+class ThrottledAdapter(BaseAdapter):
+    """Transport adapter sending requests through a RateLimiter, retrying 429s and transient errors.
+
+    Wraps the adapter the client already had (so connection pooling, urllib3 connect retries and
+    replay.ReplayAdapter keep working). Retries use jittered exponential backoff, or the
+    Retry-After the API sent, and never wait past the deadline of the build making the request.
+    A request still failing after max_retries raises RetriesExhausted.
+
+    concurrency is an optional semaphore held while a request is in flight, e.g. a
+    multiprocessing one capping requests across processes (see batch_build).
+    """
+
+    def __init__(self, adapter, limiter = None, max_retries = DEFAULT_MAX_RETRIES, concurrency = None):
+        super().__init__()
+        self.adapter = adapter
+        self.limiter = RateLimiter() if limiter is None else limiter
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+        self._random = random.Random()
+
+    def send(self, request, **kwargs):
+        retry = request.method.upper() in RETRY_METHODS
+        attempt = 0
+        while True:
+            _check_deadline()
+            self.limiter.acquire()
+            try:
+                response = self._send(request, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not retry:
+                    raise
+                if attempt >= self.max_retries:
+                    raise RetriesExhausted(f"{request.method} {request.url} still failing after {attempt + 1} attempts: {e}") from e
+                logger.info("%s %s failed (%s), retrying", request.method, request.url, e)
+                wait = self._backoff(attempt)
+            else:
+                if response.status_code not in TRANSIENT_STATUSES or not retry:
+                    self.limiter.succeeded()
+                    response.throttle_retries = attempt
+                    return response
+                retry_after = retry_after_seconds(response)
+                if response.status_code == 429:
+                    self.limiter.throttled(retry_after)
+                ## read the body so the connection goes back to the pool
+                response.content
+                response.close()
+                if attempt >= self.max_retries:
+                    raise RetriesExhausted(f"{request.method} {request.url} still {response.status_code} after {attempt + 1} attempts", response = response)
+                logger.info("%s %s returned %s, retrying", request.method, request.url, response.status_code)
+                wait = max(retry_after or 0.0, self._backoff(attempt))
+            _check_deadline(wait)
+            self.limiter.retried()
+            time.sleep(wait)
+            attempt += 1
+
+    def _send(self, request, **kwargs):
+        if self.concurrency is None:
+            return self.adapter.send(request, **kwargs)
+        with self.concurrency:
+            return self.adapter.send(request, **kwargs)
+
+    def _backoff(self, attempt):
+        ## full jitter, so workers throttled at the same time don't all come back at the same time
+        return self._random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def close(self):
+        self.adapter.close()
+
+
+def throttle(client, limiter = None, max_retries = DEFAULT_MAX_RETRIES, concurrency = None):
+    """Route every request of client through one ThrottledAdapter (once), and return it."""
+    adapter = client.get_adapter("https://")
+    if isinstance(adapter, ThrottledAdapter):
+        return adapter
+    throttled = ThrottledAdapter(adapter, limiter = limiter, max_retries = max_retries, concurrency = concurrency)
+    client.mount("https://", throttled)
+    client.mount("http://", throttled)
+    return throttled
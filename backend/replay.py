@@ -0,0 +1,147 @@
+"""Record DataRobot API responses during a crawl and replay them without an account.
+
+Recorder is a response hook that captures every request a client makes, including the ones
+dr.Project.get, dr.Model.get etc. make through it (see client_pool.use_client). ReplayClient
+is a RESTClientObject whose transport serves recorded responses instead of calling the API,
+so the SDK's parsing and error handling run exactly as they do against the real thing.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from datarobot.rest import RESTClientObject
+from requests.adapters import HTTPAdapter
+
+REPLAY_ENDPOINT = "https://replay.invalid/api/v2"
+
+
+def request_key(method, url, endpoint):
+    """"GET projects/123/?a=1", the request relative to the API root, params sorted."""
+    parts = urlsplit(url)
+    root = urlsplit(endpoint).path.rstrip("/") + "/"
+    path = parts.path[len(root):] if parts.path.startswith(root) else parts.path.lstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values = True)))
+    return f"{method.upper()} {path}" + (f"?{query}" if query else "")
+
+
+def _without_query(key):
+    return key.split("?", 1)[0]
+
+
+class Recorder:
+    """Response hook collecting {request key: response} for a fixture file."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def attach(self, client):
+        client.hooks["response"].append(self.hook)
+        return self
+
+    def hook(self, response, *args, **kwargs):
+        key = request_key(response.request.method, response.request.url, self.endpoint)
+        with self._lock:
+            self.responses[key] = dict(status = response.status_code, body = response.text)
+        return response
+
+    def save(self, path, use_case_id = None):
+        with self._lock:
+            fixtures = dict(use_case_id = use_case_id, endpoint = self.endpoint, responses = self.responses)
+        with open(path, "w") as f:
+            json.dump(fixtures, f)
+
+
+def load_fixtures(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport adapter answering requests from recorded responses, after a simulated latency.
+
+    Lookups try the exact request first and then the same path without its query string,
+    so fixtures can leave out paging and sorting params. Anything else is a 404.
+
+    rate_limit (requests per second, 429 with Retry-After beyond it) and error_rate (share of
+    requests answered 503) simulate an API under load.
+    """
+
+    def __init__(self, responses, endpoint, latency = 0.0, jitter = 0.0, seed = None, rate_limit = None, error_rate = 0.0):
+        super().__init__()
+        self.responses = responses
+        self.endpoint = endpoint
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self.missing = Counter()
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.throttled = 0
+        self.errors = 0
+        self._recent = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, self.endpoint)
+        with self._lock:
+            self.calls[key] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failure = self._failure()
+        if delay:
+            time.sleep(delay)
+        recorded = failure or self.responses.get(key) or self.responses.get(_without_query(key))
+        if recorded is None:
+            with self._lock:
+                self.missing[key] += 1
+            recorded = dict(status = 404, body = json.dumps(dict(message = f"no recorded response for {key}")))
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = "OK" if recorded["status"] < 400 else "Replay"
+        response._content = recorded["body"].encode()
+        response.headers["Content-Type"] = "application/json"
+        response.headers.update(recorded.get("headers", {}))
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def _failure(self):
+        ## a simulated 429 or 503 for the request being sent, if any. called with the lock held
+        if self.rate_limit:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.throttled += 1
+                return dict(status = 429, body = json.dumps(dict(message = "rate limit exceeded")), headers = {"Retry-After": "1"})
+            self._recent.append(now)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return dict(status = 503, body = json.dumps(dict(message = "service unavailable")))
+        return None
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class ReplayClient(RESTClientObject):
+    """A DataRobot client serving recorded (or synthetic) responses, see ReplayAdapter."""
+
+    def __init__(self, responses, endpoint = REPLAY_ENDPOINT, latency = 0.0, jitter = 0.0, seed = None, rate_limit = None, error_rate = 0.0):
+        super().__init__(auth = "replay", endpoint = endpoint)
+        self.replay = ReplayAdapter(responses, endpoint, latency = latency, jitter = jitter, seed = seed,
+                                    rate_limit = rate_limit, error_rate = error_rate)
+        self.mount("https://", self.replay)
+        self.mount("http://", self.replay)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(load_fixtures(path)["responses"], **kwargs)
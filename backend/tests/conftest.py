@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+
+import pytest
+
+## the backend is a directory of flat modules, imported by name like app.py does
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+
+from synthetic_use_case import synthetic_use_case  # noqa: E402
+
+
+def as_json(value):
+    ## what a stored graph reads back as
+    return json.loads(json.dumps(value))
+
+
+@pytest.fixture
+def use_case():
+    """(use_case_id, responses) of a small synthetic use case, see benchmarks/synthetic_use_case."""
+    return synthetic_use_case(projects = 6, models_per_project = 4, seed = 1)
+
+
+class FakeClock:
+    """Stands in for the time module: sleep advances monotonic() instead of waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import rate_limit
+    import replay
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.setattr(replay, "time", clock)
+    return clock
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from build_options import BuildOptions
+from conftest import as_json
+from create_graph_from_use_case import crawl_graph, manifest_current
+from replay import ReplayClient
+
+
+def _crawl(responses, use_case_id, **kwargs):
+    client = ReplayClient(responses)
+    nodes, edges, manifest = as_json(crawl_graph(client, use_case_id, **kwargs))
+    return nodes, edges, manifest, client.replay.total_calls
+
+
+def _drop_listed(responses, use_case_id, listing):
+    ## a copy of responses with the first asset of a use case listing deleted
+    responses = dict(responses)
+    key = f"GET useCases/{use_case_id}/{listing}"
+    page = json.loads(responses[key]["body"])
+    page["data"] = page["data"][1:]
+    page["count"] = page["totalCount"] = len(page["data"])
+    responses[key] = dict(responses[key], body = json.dumps(page))
+    return responses
+
+
+@pytest.mark.parametrize("options", [None, BuildOptions(max_depth = 1), BuildOptions(max_depth = 3),
+                                     BuildOptions(model_summary = True), BuildOptions(exclude_labels = ["datasource"])],
+                         ids = ["full", "depth1", "depth3", "summary", "exclude"])
+def test_refresh_of_an_unchanged_use_case_matches_a_full_build(use_case, options):
+    use_case_id, responses = use_case
+    nodes, edges, manifest, calls = _crawl(responses, use_case_id, options = options)
+    refreshed_nodes, refreshed_edges, refreshed_manifest, refresh_calls = _crawl(
+        responses, use_case_id, options = options, previous_nodes = nodes, previous_manifest = manifest)
+    assert (refreshed_nodes, refreshed_edges) == (nodes, edges)
+    assert refreshed_manifest == manifest
+    ## only the listings are fetched again
+    assert refresh_calls < calls / 2
+
+
+@pytest.mark.parametrize("listing", ["deployments", "registeredModels", "datasets", "projects"])
+def test_refresh_after_a_deletion_matches_a_full_build(use_case, listing):
+    use_case_id, responses = use_case
+    nodes, edges, manifest, _ = _crawl(responses, use_case_id)
+    changed = _drop_listed(responses, use_case_id, listing)
+    refreshed = _crawl(changed, use_case_id, previous_nodes = nodes, previous_manifest = manifest)[:3]
+    assert refreshed == _crawl(changed, use_case_id)[:3]
+
+
+def test_refresh_with_other_options_resolves_everything(use_case):
+    use_case_id, responses = use_case
+    nodes, edges, manifest, calls = _crawl(responses, use_case_id, options = BuildOptions(max_depth = 1))
+    full_nodes, full_edges, _, full_calls = _crawl(responses, use_case_id)
+    refreshed_nodes, refreshed_edges, _, refresh_calls = _crawl(responses, use_case_id, previous_nodes = nodes, previous_manifest = manifest)
+    assert (refreshed_nodes, refreshed_edges) == (full_nodes, full_edges)
+    assert refresh_calls == full_calls
+
+
+def test_manifest_current(use_case):
+    use_case_id, responses = use_case
+    _, _, manifest, _ = _crawl(responses, use_case_id)
+    assert manifest_current(ReplayClient(responses), use_case_id, manifest)
+    assert not manifest_current(ReplayClient(responses), use_case_id, manifest, options = BuildOptions(max_depth = 1))
+    assert not manifest_current(ReplayClient(_drop_listed(responses, use_case_id, "deployments")), use_case_id, manifest)
@@ -0,0 +1,69 @@
+import pytest
+
+from build_options import BuildOptions
+from conftest import as_json
+from create_graph_from_use_case import crawl_graph, expand_node, merge_expansion
+from graph_store import graph_file, load_graph, store_graph
+from replay import ReplayClient
+from test_graph_stream import assert_stream_matches
+
+
+def _by_id(nodes):
+    first = {}
+    for node in nodes:
+        first.setdefault(node["id"], node)
+    return first
+
+
+def _expand_all(responses, use_case_id, nodes, edges):
+    ## expand whatever is expandable, one level at a time, until nothing is
+    rounds = 0
+    while expandable := [n["id"] for n in nodes if n.get("expandable")]:
+        rounds += 1
+        for nid in expandable:
+            node = _by_id(nodes)[nid]
+            if node.get("expandable"):
+                merge_expansion(nodes, edges, *as_json(expand_node(ReplayClient(responses), node, use_case_id)))
+    return rounds
+
+
+def test_expanding_a_depth_limited_graph_gives_the_full_graph(use_case):
+    use_case_id, responses = use_case
+    full_nodes, full_edges, _ = as_json(crawl_graph(ReplayClient(responses), use_case_id))
+    nodes, edges, _ = as_json(crawl_graph(ReplayClient(responses), use_case_id, options = BuildOptions(max_depth = 0)))
+    assert any(n.get("expandable") for n in nodes)
+    assert _expand_all(responses, use_case_id, nodes, edges) > 1
+    assert _by_id(nodes) == _by_id(full_nodes)
+    assert {(e["from"], e["to"]) for e in edges} == {(e["from"], e["to"]) for e in full_edges}
+
+
+def test_expanding_a_model_summary_adds_its_models(use_case):
+    use_case_id, responses = use_case
+    full_nodes, _, _ = as_json(crawl_graph(ReplayClient(responses), use_case_id))
+    nodes, edges, _ = as_json(crawl_graph(ReplayClient(responses), use_case_id, options = BuildOptions(model_summary = True)))
+    summaries = [n for n in nodes if n["label"] == "modelSummary"]
+    assert summaries and all(n.get("expandable") for n in summaries)
+    _expand_all(responses, use_case_id, nodes, edges)
+    models = {n["id"] for n in full_nodes if n["label"] == "models"}
+    assert models <= {n["id"] for n in nodes}
+    assert not any(n.get("expandable") for n in nodes)
+
+
+def test_expansion_without_anything_to_expand_fails(use_case):
+    use_case_id, responses = use_case
+    nodes, _, _ = as_json(crawl_graph(ReplayClient(responses), use_case_id))
+    with pytest.raises(ValueError):
+        expand_node(ReplayClient(responses), nodes[0], use_case_id)
+
+
+def test_stored_stream_follows_an_expansion(tmp_path, use_case):
+    ## merged expansions are stored without a build stream, store_graph writes it from the graph
+    use_case_id, responses = use_case
+    nodes, edges, manifest = as_json(crawl_graph(ReplayClient(responses), use_case_id, options = BuildOptions(max_depth = 1)))
+    store_graph(str(tmp_path), use_case_id, nodes, edges, manifest)
+    node = next(n for n in nodes if n.get("expandable"))
+    merge_expansion(nodes, edges, *as_json(expand_node(ReplayClient(responses), node, use_case_id)))
+    store_graph(str(tmp_path), use_case_id, nodes, edges, manifest)
+    stored_nodes, stored_edges, _ = load_graph(str(tmp_path), use_case_id)
+    assert (stored_nodes, stored_edges) == (nodes, edges)
+    assert_stream_matches(graph_file(str(tmp_path), use_case_id, "stream"), nodes, edges)
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from build_options import BuildOptions
+from conftest import as_json
+from create_graph_from_use_case import _stream_batches, crawl_graph
+from replay import ReplayClient
+
+
+def read_stream(path):
+    """(nodes by id, edges, last record) of an NDJSON graph stream, upserting nodes like a client."""
+    nodes, edges, last = {}, [], None
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["type"] == "node":
+                nodes[record["data"]["id"]] = record["data"]
+            elif record["type"] == "edge":
+                edges.append(record["data"])
+            else:
+                last = record
+    return nodes, edges, last
+
+
+def assert_stream_matches(path, nodes, edges):
+    streamed_nodes, streamed_edges, end = read_stream(path)
+    first = {}
+    for node in nodes:
+        first.setdefault(node["id"], node)
+    assert streamed_nodes == first
+    assert sorted(map(json.dumps, streamed_edges)) == sorted(map(json.dumps, edges))
+    assert end == dict(type = "end", nodes = len(first), edges = len(edges))
+
+
+@pytest.mark.parametrize("max_workers", [1, 8])
+@pytest.mark.parametrize("options", [None, BuildOptions(max_depth = 1), BuildOptions(max_depth = 2),
+                                     BuildOptions(max_depth = 1, model_summary = True)],
+                         ids = ["full", "depth1", "depth2", "summary-depth1"])
+def test_stream_matches_the_returned_graph(tmp_path, use_case, max_workers, options):
+    ## with a depth limit, ancestors streamed expandable can turn up resolved as top level nodes later
+    use_case_id, responses = use_case
+    stream = tmp_path / "graph.ndjson"
+    nodes, edges, _ = as_json(crawl_graph(ReplayClient(responses), use_case_id, max_workers = max_workers,
+                                          stream_to = stream, options = options))
+    assert_stream_matches(stream, nodes, edges)
+
+
+def test_stream_ends_with_an_error_record_when_the_build_fails(tmp_path):
+    stream = tmp_path / "graph.ndjson"
+
+    def batches():
+        yield [dict(assetId = "d1", label = "datasets", parents = [dict(assetId = "s1", label = "datasource")])]
+        raise RuntimeError("listing failed")
+
+    with pytest.raises(RuntimeError):
+        for _ in _stream_batches(batches(), stream):
+            pass
+    nodes, edges, last = read_stream(stream)
+    assert set(nodes) == {"d1", "s1"}
+    assert edges == [{"from": "s1", "to": "d1"}]
+    assert last == dict(type = "error", message = "listing failed")
@@ -0,0 +1,77 @@
+import json
+import os
+
+from lineage_index import LineageIndex, LineageIndexCache
+
+##   store -> source -> dataset -> project -> model -> deployment
+##                                 dataset2 ->/
+NODES = [dict(id = "deployment", label = "deployments", color = "red"),
+         dict(id = "dataset2", label = "datasets", color = "red"),
+         dict(id = "model", label = "models"),
+         dict(id = "project", label = "projects"),
+         dict(id = "dataset", label = "datasets"),
+         dict(id = "source", label = "datasource"),
+         dict(id = "store", label = "datastore"),
+         ## a later duplicate of a top level node, as parent copies show up in the nodes file
+         dict(id = "deployment", label = "deployments")]
+EDGES = [{"from": "model", "to": "deployment"},
+         {"from": "project", "to": "model"},
+         {"from": "dataset", "to": "project"},
+         {"from": "dataset2", "to": "project"},
+         {"from": "source", "to": "dataset"},
+         {"from": "store", "to": "source"},
+         {"from": "project", "to": "model"}]
+
+
+def _ids(walk):
+    return {n["id"]: n["depth"] for n in walk["nodes"]}
+
+
+def test_ancestors():
+    walk = LineageIndex(NODES, EDGES).ancestors("deployment")
+    assert walk["root"] == "deployment"
+    assert _ids(walk) == dict(deployment = 0, model = 1, project = 2, dataset = 3, dataset2 = 3, source = 4, store = 5)
+    ## duplicate edges are walked once
+    assert len(walk["edges"]) == 6
+    assert walk["nodes"][0]["color"] == "red"
+
+
+def test_descendants():
+    walk = LineageIndex(NODES, EDGES).descendants("source")
+    assert _ids(walk) == dict(source = 0, dataset = 1, project = 2, model = 3, deployment = 4)
+    assert {"from": "source", "to": "dataset"} in walk["edges"]
+
+
+def test_max_depth():
+    index = LineageIndex(NODES, EDGES)
+    assert _ids(index.ancestors("deployment", max_depth = 2)) == dict(deployment = 0, model = 1, project = 2)
+    assert _ids(index.ancestors("deployment", max_depth = 0)) == dict(deployment = 0)
+
+
+def test_labels_filter_what_is_returned_not_what_is_walked():
+    walk = LineageIndex(NODES, EDGES).ancestors("deployment", labels = {"datasets", "datastore"})
+    assert _ids(walk) == dict(deployment = 0, dataset = 3, dataset2 = 3, store = 5)
+    ## only edges between nodes that are returned
+    assert walk["edges"] == []
+
+
+def test_unknown_node():
+    index = LineageIndex(NODES, EDGES)
+    assert "missing" not in index
+    assert index.ancestors("missing") == dict(root = "missing", nodes = [], edges = [])
+
+
+def test_cache_reloads_changed_files(tmp_path):
+    node_file, edge_file = tmp_path / "nodes.json", tmp_path / "edges.json"
+    node_file.write_text(json.dumps(NODES))
+    edge_file.write_text(json.dumps(EDGES))
+    cache = LineageIndexCache(max_graphs = 1)
+    index = cache.get(str(node_file), str(edge_file))
+    assert cache.get(str(node_file), str(edge_file)) is index
+    edge_file.write_text(json.dumps(EDGES[:1]))
+    ## a rewrite within the same mtime tick would be missed, make sure this one is seen
+    stat = edge_file.stat()
+    os.utime(edge_file, ns = (stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    reloaded = cache.get(str(node_file), str(edge_file))
+    assert reloaded is not index
+    assert _ids(reloaded.ancestors("deployment")) == dict(deployment = 0, model = 1)
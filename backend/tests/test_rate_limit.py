@@ -0,0 +1,111 @@
+import email.utils
+import time
+
+import pytest
+import requests
+from datarobot.errors import ServerError
+
+from rate_limit import (MIN_REQUESTS_PER_SECOND, BuildDeadlineExceeded, RateLimiter, RetriesExhausted, deadline,
+                        retry_after_seconds, throttle)
+from replay import ReplayClient
+
+RESPONSES = {"GET version/": dict(status = 200, body = "{}")}
+
+
+def _response(**headers):
+    response = requests.Response()
+    response.headers.update(headers)
+    return response
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(_response(**{"Retry-After": "3"})) == 3.0
+    assert retry_after_seconds(_response(**{"Retry-After": "-1"})) == 0.0
+    assert retry_after_seconds(_response(**{"Retry-After": "soon"})) is None
+    assert retry_after_seconds(_response()) is None
+    date = email.utils.formatdate(time.time() + 30, usegmt = True)
+    assert 25 < retry_after_seconds(_response(**{"Retry-After": date})) <= 30
+
+
+def test_rate_limiter_halves_on_429_and_recovers():
+    limiter = RateLimiter(rate = 10, max_rate = 10.1)
+    limiter.throttled()
+    assert limiter.rate == 5
+    for _ in range(10):
+        limiter.succeeded()
+    assert limiter.rate == pytest.approx(5.5)
+    for _ in range(100):
+        limiter.succeeded()
+    assert limiter.rate == 10.1
+    for _ in range(20):
+        limiter.throttled()
+    assert limiter.rate == MIN_REQUESTS_PER_SECOND
+
+
+def test_rate_limiter_spaces_requests(clock):
+    limiter = RateLimiter(rate = 2, burst = 1)
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.now - 1000.0 == pytest.approx(2.0)
+
+
+def test_429_is_retried_after_retry_after(clock):
+    client = ReplayClient(RESPONSES, rate_limit = 1)
+    adapter = throttle(client, RateLimiter(rate = 100, max_rate = 100))
+    assert client.get("version/").status_code == 200
+    response = client.get("version/")
+    assert response.status_code == 200
+    ## the replayed API asks for Retry-After: 1, the backoff of a first retry is shorter
+    assert response.throttle_retries == client.replay.throttled >= 1
+    assert max(clock.sleeps) >= 1.0
+    assert adapter.limiter.stats()["throttled"] == client.replay.throttled
+    assert adapter.limiter.rate < 100
+
+
+def test_transient_errors_exhaust_retries(clock):
+    client = ReplayClient(RESPONSES, error_rate = 1.0)
+    throttle(client, max_retries = 2)
+    with pytest.raises(RetriesExhausted) as e:
+        client.get("version/")
+    assert e.value.response.status_code == 503
+    assert client.replay.errors == 3
+
+
+def test_timeouts_exhaust_retries(clock, monkeypatch):
+    client = ReplayClient(RESPONSES)
+    attempts = []
+
+    def timeout(request, **kwargs):
+        attempts.append(request)
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    monkeypatch.setattr(client.replay, "send", timeout)
+    throttle(client, max_retries = 2)
+    with pytest.raises(RetriesExhausted) as e:
+        client.get("version/")
+    assert isinstance(e.value.__cause__, requests.exceptions.ReadTimeout)
+    assert len(attempts) == 3
+
+
+def test_only_idempotent_requests_are_retried(clock):
+    client = ReplayClient(RESPONSES, error_rate = 1.0)
+    throttle(client)
+    with pytest.raises(ServerError):
+        client.post("version/")
+    assert client.replay.errors == 1
+
+
+def test_deadline_fails_instead_of_waiting(clock):
+    client = ReplayClient(RESPONSES, rate_limit = 1)
+    throttle(client, RateLimiter(rate = 100, max_rate = 100))
+    client.get("version/")
+    with deadline(0.5), pytest.raises(BuildDeadlineExceeded):
+        client.get("version/")
+    ## gave up without sleeping out the Retry-After
+    assert sum(clock.sleeps) < 0.5
+
+
+def test_throttle_wraps_a_client_once():
+    client = ReplayClient(RESPONSES)
+    assert throttle(client) is throttle(client)
+    assert client.get_adapter("https://").adapter is client.replay
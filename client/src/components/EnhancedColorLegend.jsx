@@ -15,6 +15,7 @@ const EnhancedColorLegend = ({ nodes, onNodeSearch, isFloating = false, onToggle
         // Projects & Models  
         'projects': { color: '#2196F3', category: 'Projects & Models', description: 'ML projects' },
         'models': { color: '#1976D2', category: 'Projects & Models', description: 'ML models' },
+        'modelSummary': { color: '#0D47A1', category: 'Projects & Models', description: 'Project leaderboards (expandable)' },
         'customModelVersion': { color: '#42A5F5', category: 'Projects & Models', description: 'Custom model versions' },
         'registeredModels': { color: '#64B5F6', category: 'Projects & Models', description: 'Registered models' },
         